@@ -0,0 +1,77 @@
+"""Scoring many candidate solutions at once with array operations over the whole batch, instead of one solution and
+one tile at a time:
+
+    tiles = tile_codes(boards)                      #   (N, cols, rows)
+    c = connection_arrays(lines, cols, rows)        #   (N, cols+1, rows+1, 2)
+    labels, solved = evaluate(tiles, c)
+
+Lines are taken as given, so they should come from the theory or from validator.validate(). Like the validator, a
+board is solved when no region separated by the line holds both a white and a black square.
+"""
+import numpy as np
+
+from boards import BLACK, EMPTY, TILE_CODES, WHITE
+from run import line_connections, parse_board
+
+
+def tile_codes(boards) -> np.ndarray:
+    """Stacks static boards (same format as the board in run.py) into an (N, cols, rows) array of tile codes,
+    indexed as tiles[n, x, y]."""
+    return np.array([[[TILE_CODES.get(tile, EMPTY) for tile in column] for column in parse_board(board)[2]]
+                     for board in boards], dtype=np.int8)
+
+
+def connection_arrays(lines, cols, rows) -> np.ndarray:
+    """Stacks static lines (same format as the line in run.py) into an (N, cols+1, rows+1, 2) array of connections,
+    indexed like c(x,y,z)."""
+    c = np.zeros((len(lines), cols + 1, rows + 1, 2), dtype=bool)
+    for n, line in enumerate(lines):
+        for x, y, z in line_connections(line):
+            c[n, x, y, z] = True
+    return c
+
+
+def adjacency(c):
+    """Returns which neighbouring tiles touch without the line separating them, as two arrays:
+    up[n, x, y] for tiles (x, y) and (x, y+1), which are separated by c(x,y+1,1), and
+    right[n, x, y] for tiles (x, y) and (x+1, y), which are separated by c(x+1,y,0)."""
+    up = ~c[:, :-1, 1:-1, 1]
+    right = ~c[:, 1:-1, :-1, 0]
+    return up, right
+
+
+def region_labels(up, right) -> np.ndarray:
+    """Labels every tile with the smallest x * rows + y of any tile in its region, by spreading the smallest label
+    across every open side until nothing changes."""
+    n, cols, rows = up.shape[0], right.shape[1] + 1, up.shape[2] + 1
+    unreachable = cols * rows
+    labels = np.broadcast_to(np.arange(cols * rows, dtype=np.int32).reshape(cols, rows), (n, cols, rows)).copy()
+    while True:
+        previous = labels.copy()
+        for open_side, axis in ((up, 2), (right, 1)):
+            low = [slice(None)] * 3
+            high = [slice(None)] * 3
+            low[axis], high[axis] = slice(None, -1), slice(1, None)
+            low, high = tuple(low), tuple(high)
+            np.minimum(labels[low], np.where(open_side, labels[high], unreachable), out=labels[low])
+            np.minimum(labels[high], np.where(open_side, labels[low], unreachable), out=labels[high])
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def solved(tiles, labels) -> np.ndarray:
+    """Returns an (N,) array that is true for every board where no region holds both a white and a black square."""
+    n, cols, rows = tiles.shape
+    boards = np.broadcast_to(np.arange(n)[:, None, None], labels.shape)
+    white = np.zeros((n, cols * rows), dtype=bool)
+    black = np.zeros((n, cols * rows), dtype=bool)
+    white[boards[tiles == WHITE], labels[tiles == WHITE]] = True
+    black[boards[tiles == BLACK], labels[tiles == BLACK]] = True
+    return ~(white & black).any(axis=1)
+
+
+def evaluate(tiles, c):
+    """Returns the region labels (see region_labels()) and the solved flags (see solved()) of a batch of boards and
+    lines."""
+    labels = region_labels(*adjacency(c))
+    return labels, solved(tiles, labels)
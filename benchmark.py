@@ -0,0 +1,247 @@
+"""Benchmark suite: every mode of run.py on boards from 2x2 to 8x8, with each connectivity encoding and both ways of
+building a theory (NNF constraints compiled by bauhaus, or the CNF builder that emits clauses directly).
+
+    python3 benchmark.py                                  # whole sweep, written to benchmark_results.json
+    python3 benchmark.py --sizes 3x3 4x3 --modes 1 2 --encoders cnf
+    python3 benchmark.py --baseline benchmark_baseline.json
+
+Each case runs in a fresh process, and records the wall time and peak memory of every phase separately: building
+the theory (BlackAndWhiteSquares), compiling it (E.compile()), satisfiable(), solve() and counting its solutions
+with dsharp, along with the number of variables and clauses, their breakdown by constraint family
+(BlackAndWhiteSquares.family_sizes()), and the SAT solver's statistics while solving. Peak memory is the process's
+peak resident set size during the phase (reset between phases), so it includes the SAT solver's memory; while
+counting, it also includes dsharp's.
+
+Results are written as JSON, one case per line. Given a baseline (the results of an earlier run, e.g. the stored
+benchmark_baseline.json), the results are compared to it case by case, and the changes beyond --tolerance are listed.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import sys
+import time
+
+import run
+from cnf import CNF
+from generator import random_layout
+from run import MODES, parse_size
+
+
+SIZES = [(2, 2), (3, 2), (3, 3), (4, 3), (4, 4), (5, 4), (5, 5), (6, 6), (8, 6), (8, 8)]
+
+PHASES = ("build", "compile", "satisfiable", "solve", "count")
+
+#   Largest boards (in tiles) whose solutions are counted with dsharp, per mode. Counting free boards takes up to a
+#   minute at 3x2 and runs out of memory from 3x3 on (see ddnnf.py), static boards take minutes from 8x8 on, and static
+#   lines take about a second at 8x8. Theories with lazy connectivity allow separate loops, so they're never counted.
+COUNT_MAX_TILES = {0: 6, 1: 6, 2: 25, 3: 64}
+
+#   Phases faster than this are too noisy to compare times against a baseline:
+MIN_SECONDS = 0.05
+
+
+def static_layout(cols, rows):
+    """The static board and line of modes 2 and 3 for a board size, the same on every run."""
+    rng = random.Random(f"{cols}x{rows}")
+    layout = None
+    while layout is None:
+        layout = random_layout(cols, rows, 0.5, rng)
+    return layout
+
+
+def reset_peak_memory():
+    """Resets the peak resident set size of this process, if the platform allows it (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fp:
+            fp.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory() -> float:
+    """Peak resident set size of this process in MB, since the last reset_peak_memory()."""
+    try:
+        with open("/proc/self/status") as fp:
+            for line in fp:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    #   Without /proc, the peak since the process started (in kB on Linux, but in bytes on macOS):
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def child_peak_memory() -> float:
+    """Largest peak resident set size of the processes this process started (i.e. dsharp) in MB."""
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def measure(cols, rows, mode, connectivity, encoder) -> dict:
+    """Runs every phase of one case in this process, and returns its record."""
+    board, line = static_layout(cols, rows)
+    arguments = [{}, {"only_solved": True}, {"board": board, "only_solved": True},
+                 {"line": line, "only_solved": True}][mode]
+    lazy = connectivity == "lazy"
+    record = {"mode": mode, "cols": cols, "rows": rows, "connectivity": connectivity, "encoder": encoder,
+              "phases": {}}
+
+    def phase(name, function):
+        reset_peak_memory()
+        start = time.perf_counter()
+        result = function()
+        record["phases"][name] = {"seconds": round(time.perf_counter() - start, 4), "peak_mb": round(peak_memory(), 1)}
+        return result
+
+    E = phase("build", lambda: run.example_theory(cols, rows, connectivity=connectivity, encoder=encoder,
+                                                   **arguments))
+    T = phase("compile", E.compile)
+    theory = T if encoder == "cnf" else CNF.from_nnf(T)
+    record["vars"] = theory.num_vars
+    record["clauses"] = len(theory.clauses)
+    record["families"] = {family or "other": size._asdict() for family, size in E.family_sizes().items()}
+    record["satisfiable"] = phase("satisfiable", (T.to_nnf() if encoder == "cnf" else T).satisfiable)
+    record["solver"] = {}
+    phase("solve", lambda: run.solve(T, lazy, profile=record["solver"].update))
+    if not lazy and cols * rows <= COUNT_MAX_TILES[mode]:
+        #   A failed count (e.g. without dsharp) keeps the phases measured before it.
+        try:
+            record["solutions"] = phase("count", lambda: run.count(T))
+            count = record["phases"]["count"]
+            count["peak_mb"] = max(count["peak_mb"], round(child_peak_memory(), 1))
+        except Exception as error:
+            record["error"] = f"count: {error!r}"
+    return record
+
+
+def _measure_into(connection, *case):
+    try:
+        connection.send(measure(*case))
+    except Exception as error:
+        connection.send({"error": repr(error)})
+
+
+def measure_in_process(cols, rows, mode, connectivity, encoder, timeout) -> dict:
+    """Runs measure() in a fresh process, so that no case's memory or caches carry over to the next one. Cases that
+    fail or take longer than timeout seconds are recorded with an "error"."""
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_measure_into, args=(sender, cols, rows, mode, connectivity, encoder))
+    process.start()
+    sender.close()
+    if receiver.poll(timeout):
+        try:
+            record = receiver.recv()
+        except EOFError:    #   Killed, e.g. for running out of memory.
+            process.join()
+            record = {"error": f"exited with code {process.exitcode}"}
+    else:
+        process.kill()
+        record = {"error": f"timed out after {timeout}s"}
+    process.join()
+    if "error" in record:
+        record = {"mode": mode, "cols": cols, "rows": rows, "connectivity": connectivity, "encoder": encoder,
+                  "phases": {}, **record}
+    return record
+
+
+def key(record) -> tuple:
+    return record["mode"], record["cols"], record["rows"], record["connectivity"], record["encoder"]
+
+
+def compare(results, baseline, tolerance) -> list:
+    """Returns the changes from the baseline's records to the results' records of the same cases, as (record,
+    description) pairs: different variable or clause counts (in total or of a constraint family), solution counts or
+    errors, and phases that got more than tolerance (e.g. 0.25 for 25%) slower/faster or use more/less memory."""
+    previous = {key(record): record for record in baseline}
+    changes = []
+    for record in results:
+        old = previous.get(key(record))
+        if old is None:
+            continue
+        for field in ("vars", "clauses", "satisfiable", "solutions", "error"):
+            if old.get(field) != record.get(field):
+                changes.append((record, f"{field} {old.get(field)} -> {record.get(field)}"))
+        for family, size in record.get("families", {}).items():
+            before = old.get("families", {}).get(family)
+            if before is not None and before != size:
+                changes.append((record, f"{family} " + ", ".join(f"{field} {before[field]} -> {size[field]}"
+                                                                 for field in size if before[field] != size[field])))
+        for name in PHASES:
+            if name not in old["phases"] or name not in record["phases"]:
+                continue
+            before, after = old["phases"][name], record["phases"][name]
+            if max(before["seconds"], after["seconds"]) >= MIN_SECONDS \
+                    and abs(after["seconds"] - before["seconds"]) > tolerance * before["seconds"]:
+                changes.append((record, f"{name} {before['seconds']:.3f}s -> {after['seconds']:.3f}s "
+                                        f"({after['seconds'] / max(before['seconds'], 1e-9):.2f}x)"))
+            if abs(after["peak_mb"] - before["peak_mb"]) > tolerance * before["peak_mb"]:
+                changes.append((record, f"{name} peak {before['peak_mb']:.1f}MB -> {after['peak_mb']:.1f}MB "
+                                        f"({after['peak_mb'] / before['peak_mb']:.2f}x)"))
+    return changes
+
+
+def write_results(fp, results):
+    """Writes results as JSON with one record per line, so that a stored baseline's diffs show the cases that
+    changed."""
+    fp.write(f'{{"python": {json.dumps(platform.python_version())}, '
+             f'"platform": {json.dumps(platform.platform())}, "results": [\n')
+    fp.write(",\n".join(json.dumps(record, separators=(",", ":")) for record in results))
+    fp.write("\n]}\n")
+
+
+def case_name(record) -> str:
+    return f"{MODES[record['mode']]} {record['cols']}x{record['rows']} {record['connectivity']} {record['encoder']}"
+
+
+def print_record(record):
+    phases = record["phases"]
+    times = "".join(f"{phases[name]['seconds']:>10.3f}" if name in phases else f"{'-':>10}" for name in PHASES)
+    peak = max((phases[name]["peak_mb"] for name in phases), default=0)
+    size = f"{record['cols']}x{record['rows']}"
+    print(f"{MODES[record['mode']]:<22}{size:<6}{record['connectivity']:<14}"
+          f"{record['encoder']:<9}{times}{peak:>9.1f}{record.get('vars', '-'):>9}{record.get('clauses', '-'):>10}"
+          + (f"  {record['error']}" if "error" in record else ""), flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark building, compiling, solving and counting theories.")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=SIZES, help="board sizes, e.g. 3x3 4x3")
+    parser.add_argument("--modes", type=int, nargs="+", choices=sorted(MODES), default=sorted(MODES))
+    parser.add_argument("--connectivity", nargs="+", choices=run.BlackAndWhiteSquares.CONNECTIVITY_ENCODINGS,
+                        default=list(run.BlackAndWhiteSquares.CONNECTIVITY_ENCODINGS))
+    parser.add_argument("--encoders", nargs="+", choices=run.BlackAndWhiteSquares.ENCODERS,
+                        default=list(run.BlackAndWhiteSquares.ENCODERS))
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per case (default: 600)")
+    parser.add_argument("--output", default="benchmark_results.json", help="(default: benchmark_results.json)")
+    parser.add_argument("--baseline", help="results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative change from the baseline to report (default: 0.25)")
+    args = parser.parse_args()
+
+    header = f"{'Mode':<22}{'Size':<6}{'Connectivity':<14}{'Encoder':<9}" \
+             + "".join(f"{name.capitalize():>10}" for name in PHASES) + f"{'Peak MB':>9}{'Vars':>9}{'Clauses':>10}"
+    print(header)
+    print("-" * len(header))
+    results = []
+    for cols, rows in args.sizes:
+        for mode in args.modes:
+            for connectivity in args.connectivity:
+                for encoder in args.encoders:
+                    record = measure_in_process(cols, rows, mode, connectivity, encoder, args.timeout)
+                    print_record(record)
+                    results.append(record)
+
+    with open(args.output, "w") as fp:
+        write_results(fp, results)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            changes = compare(results, json.load(fp)["results"], args.tolerance)
+        print(f"\n{len(changes)} change(s) from {args.baseline}:")
+        for record, description in changes:
+            print(f"  {case_name(record)}: {description}")
@@ -0,0 +1,111 @@
+"""Static boards in a compact format: the tile codes of a board as bytes, column by column so that tile (x, y) is at
+x * rows + y, with the starting and ending points. Nothing has to be rotated to read a tile, and any number of
+boards of one size can be loaded from a file at once:
+
+    board = pack_board([[[3, 3], [0, 0]], ["B", "W", "W"], ["B", "", "W"], ["B", "W", "W"]])
+    with open("boards.bin", "wb") as fp:
+        write_boards([board], fp, 3, 3)
+    with open("boards.bin", "rb") as fp:
+        starts, ends, tiles = load_boards(fp)       #   (N, 2), (N, 2) and (N, cols, rows) arrays
+
+A PackedBoard can be given anywhere a static board goes (BlackAndWhiteSquares, static_literals(), validate(), ...).
+The tile codes and file header here are shared by every other packed format of boards (batch.py, stream.py).
+"""
+import struct
+from collections import namedtuple
+
+#   cols, rows: the size of the board.
+#   start, end: the starting and ending points, as (x, y).
+#   tiles: cols * rows bytes of tile codes, tile (x, y) at x * rows + y.
+PackedBoard = namedtuple("PackedBoard", ["cols", "rows", "start", "end", "tiles"])
+
+#   Tile codes:
+EMPTY, WHITE, BLACK = 0, 1, 2
+TILE_CODES = {"": EMPTY, "W": WHITE, "B": BLACK}
+TILES = {code: tile for tile, code in TILE_CODES.items()}
+
+#   Binary files of boards (and of solutions, see stream.py) start with this header: magic, columns, rows.
+FILE_HEADER = struct.Struct("<4sHH")
+
+#   Board files are followed by one record per board: the starting and ending points (BOARD_POINTS), then the tiles
+#   of the board.
+BOARD_MAGIC = b"BWB1"
+BOARD_POINTS = struct.Struct("<HHHH")
+
+
+def pack_board(board) -> PackedBoard:
+    """Packs a static board in the format of run.py (rows of tiles from the top, after the points)."""
+    (start, end), tiles = board[0], board[1:]
+    cols, rows = len(tiles[0]), len(tiles)
+    return PackedBoard(cols, rows, tuple(start), tuple(end),
+                       bytes(TILE_CODES[tiles[rows - 1 - y][x]] for x in range(cols) for y in range(rows)))
+
+
+def unpack_board(board: PackedBoard) -> list:
+    """The static board in the format of run.py, e.g. to print it or write it as JSON."""
+    columns = board_columns(board)
+    return [[list(board.start), list(board.end)]] + [[columns[x][y] for x in range(board.cols)]
+                                                     for y in reversed(range(board.rows))]
+
+
+def board_columns(board: PackedBoard) -> list:
+    """The tiles of a packed board as tiles[x][y] ("W", "B" or "" like run.parse_board())."""
+    rows = board.rows
+    if len(board.tiles) != board.cols * rows:
+        raise Exception(f"A {board.cols}x{rows} board needs {board.cols * rows} tiles, not {len(board.tiles)}.")
+    return [[TILES[code] for code in board.tiles[x * rows:(x + 1) * rows]] for x in range(board.cols)]
+
+
+def pack_array(tiles, start, end) -> PackedBoard:
+    """Packs a (cols, rows) array of tile codes, indexed as tiles[x, y] like batch.tile_codes(), without copying it
+    tile by tile."""
+    import numpy as np  #   Only needed for arrays, so run.py can use this module without numpy.
+
+    tiles = np.asarray(tiles, dtype=np.uint8)
+    cols, rows = tiles.shape
+    return PackedBoard(cols, rows, tuple(start), tuple(end), tiles.tobytes())
+
+
+def write_boards(boards, fp, cols: int, rows: int) -> int:
+    """Writes packed boards of one size to a binary file in the format read by read_boards() and load_boards().
+    Returns the number of boards written."""
+    fp.write(FILE_HEADER.pack(BOARD_MAGIC, cols, rows))
+    count = 0
+    for board in boards:
+        if (board.cols, board.rows) != (cols, rows):
+            raise Exception(f"Can't write a {board.cols}x{board.rows} board to a file of {cols}x{rows} boards.")
+        fp.write(BOARD_POINTS.pack(*board.start, *board.end) + board.tiles)
+        count += 1
+    return count
+
+
+def _read_header(fp):
+    magic, cols, rows = FILE_HEADER.unpack(fp.read(FILE_HEADER.size))
+    if magic != BOARD_MAGIC:
+        raise Exception("Not a packed boards file.")
+    return cols, rows
+
+
+def read_boards(fp):
+    """Yields the PackedBoards in a file written by write_boards(), one at a time."""
+    cols, rows = _read_header(fp)
+    record_bytes = BOARD_POINTS.size + cols * rows
+    while True:
+        data = fp.read(record_bytes)
+        if len(data) < record_bytes:
+            return
+        s_x, s_y, e_x, e_y = BOARD_POINTS.unpack_from(data)
+        yield PackedBoard(cols, rows, (s_x, s_y), (e_x, e_y), data[BOARD_POINTS.size:])
+
+
+def load_boards(fp):
+    """Loads every board in a file written by write_boards() in one read, as arrays of the starting points (N, 2),
+    the ending points (N, 2) and the tile codes (N, cols, rows), indexed like batch.tile_codes()."""
+    import numpy as np
+
+    cols, rows = _read_header(fp)
+    record_bytes = BOARD_POINTS.size + cols * rows
+    data = np.frombuffer(fp.read(), dtype=np.uint8)
+    records = data[:len(data) - len(data) % record_bytes].reshape(-1, record_bytes)
+    points = records[:, :BOARD_POINTS.size].copy().view("<u2").reshape(-1, 2, 2)
+    return points[:, 0], points[:, 1], records[:, BOARD_POINTS.size:].reshape(-1, cols, rows)
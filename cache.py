@@ -0,0 +1,109 @@
+"""Persistent on-disk cache of the structural theory of each board size, so repeated puzzle checks at the same size
+skip building the theory entirely. Static boards and static lines are applied on top as solver assumptions:
+
+    cnf = TheoryCache().load(3, 3)
+    enumerate_solutions(cnf, assumptions=static_literals(cnf.index, board=board, only_solved=True))
+
+Structural theories compiled to d-DNNF (see ddnnf.py) are cached the same way, for counting and sampling:
+
+    compiled = TheoryCache().load_compiled(2, 2)
+    compiled.count(static_literals(compiled.index, only_solved=True))
+"""
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+
+import cnf
+from ddnnf import DDNNF
+from run import BlackAndWhiteSquares
+
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "theory_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+#   Hash of the code that builds theories, so cached theories are rebuilt whenever the constraints change.
+BUILDER_VERSION = hashlib.sha256((inspect.getsource(cnf) + inspect.getsource(BlackAndWhiteSquares)).encode()).hexdigest()
+
+
+class TheoryCache:
+    """Structural theories stored as DIMACS files (with the variable index layout) in a directory, keyed by board
+    size, connectivity encoding and BUILDER_VERSION. Once the files take up more than max_bytes, the least recently
+    used ones are deleted."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, cols, rows, connectivity, suffix=".cnf") -> str:
+        key = json.dumps({"cols": cols, "rows": rows, "connectivity": connectivity, "builder": BUILDER_VERSION})
+        digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{cols}x{rows}-{connectivity}-{digest}{suffix}")
+
+    def load(self, cols, rows, connectivity="distance") -> cnf.CNF:
+        """Returns the structural theory of the given size, building and storing it if it isn't cached yet."""
+        path = self.path(cols, rows, connectivity)
+        try:
+            with open(path) as fp:
+                theory = cnf.CNF.read_dimacs(fp)
+                os.utime(fp.fileno())  #   Mark as recently used.
+            return theory
+        except FileNotFoundError:
+            pass
+
+        theory = BlackAndWhiteSquares(cols, rows, None, None, False, connectivity, "cnf", structural=True).cnf
+        self.store(path, theory.write_dimacs)
+        return theory
+
+    def load_compiled(self, cols, rows, connectivity="distance") -> DDNNF:
+        """Returns the structural theory of the given size compiled to d-DNNF, compiling and storing it if it isn't
+        cached yet. Compiling takes seconds for boards up to 3x2, but runs out of memory from 3x3 on."""
+        if connectivity == "lazy":
+            raise Exception("Theories with lazy connectivity allow separate loops, so they can't be compiled to count.")
+        path = self.path(cols, rows, connectivity, ".nnf")
+        try:
+            with open(path) as fp:
+                compiled = DDNNF.load(fp)
+                os.utime(fp.fileno())  #   Mark as recently used.
+            return compiled
+        except FileNotFoundError:
+            pass
+
+        compiled = DDNNF.compile(self.load(cols, rows, connectivity))
+        self.store(path, compiled.save)
+        return compiled
+
+    def store(self, path, write):
+        """Writes a file into the cache with write(fp), then evicts other files if the cache is too large."""
+        os.makedirs(self.directory, exist_ok=True)
+
+        #   Write to a temporary file first so other processes never read a partly written file.
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fp:
+            write(fp)
+        os.replace(temporary_path, path)
+
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Deletes the least recently used files until the cache fits in max_bytes (never deleting keep)."""
+        #   Other processes may delete theories at the same time, so missing files are skipped.
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith((".cnf", ".nnf")):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
@@ -0,0 +1,153 @@
+"""Checking many static boards and/or lines of one size against a single warm incremental SAT solver:
+
+    with BoardChecker(3, 3) as checker:
+        for board in boards:
+            valid, solved, solution = checker.check(board=board)
+"""
+from collections import namedtuple
+
+from pysat.solvers import Solver
+
+from run import BlackAndWhiteSquares, INCREMENTAL_SOLVER, PROJECTED_PROPOSITIONS, empty_tile_groups, \
+    enumerate_solutions, find_loops, line_connections, parse_board, static_literals
+
+#   valid: the given board and/or line are part of at least one valid configuration.
+#   solved: that configuration can be solved (always the case for a valid board and line that solve each other).
+#   solution: a solved configuration if there is one, otherwise any valid one (None if not valid).
+Check = namedtuple("Check", ["valid", "solved", "solution"])
+
+
+class BoardChecker:
+    """The structural theory of one board size (see BlackAndWhiteSquares' structural argument), loaded into an
+    incremental SAT solver once. Every check only adds the static_literals() of its board and/or line as
+    assumptions, so it costs a single incremental solve call instead of building a theory.
+
+    The structural theory only follows regions across single empty tiles, so a board with empty tiles next to each
+    other gets a theory of its own instead (see BlackAndWhiteSquares.build_region_constraints()).
+
+    The structural theory comes from the given TheoryCache if there is one. A checker keeps solver state between
+    checks, so it must not be shared between threads."""
+
+    def __init__(self, cols, rows, connectivity="binary", cache=None):
+        self.cols = cols
+        self.rows = rows
+        self.connectivity = connectivity
+        self.lazy = connectivity == "lazy"
+        if cache is not None:
+            self.cnf = cache.load(cols, rows, connectivity)
+        else:
+            self.cnf = BlackAndWhiteSquares(cols, rows, None, None, False, connectivity, "cnf", structural=True).cnf
+        self.num_vars = self.cnf.num_vars
+        self.solver = Solver(name=INCREMENTAL_SOLVER, bootstrap_with=self.cnf.clauses)
+
+    def close(self):
+        self.solver.delete()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _solve(self, assumptions, budget=None):
+        """Returns the decoded model of a solve under the assumptions, or None. With a budget, returns False instead
+        if the solver gives up after that many conflicts. In lazy mode, loops separate from the line are cut off
+        permanently (no solution of any puzzle can have them)."""
+        while True:
+            if budget is None:
+                satisfiable = self.solver.solve(assumptions=assumptions)
+            else:
+                self.solver.conf_budget(budget)
+                satisfiable = self.solver.solve_limited(assumptions=assumptions)
+            if not satisfiable:
+                return None if satisfiable is False else False
+            model = self.solver.get_model()
+            solution = self.cnf.decode(model)
+            loops = find_loops(solution) if self.lazy else []
+            if not loops:
+                return solution
+            for loop in loops:
+                self.solver.add_clause([-self.cnf.index.id(*connection) for connection in loop])
+
+    def board_theory(self, board, line, only_solved):
+        """A theory of its own for a static board with empty tiles next to each other, or None for any other board
+        (which the structural theory handles)."""
+        if not board or not empty_tile_groups(parse_board(board)[2]):
+            return None
+        return BlackAndWhiteSquares(self.cols, self.rows, board, line, only_solved, self.connectivity, "cnf").cnf
+
+    def check(self, board=None, line=None) -> Check:
+        """Checks a static board (same format as the board in run.py), a static line (same format as the line in
+        run.py), or both. Boards and lines with points off the board aren't valid."""
+        index = self.cnf.index
+        try:
+            literals = static_literals(index, board, line)
+        except IndexError:
+            return Check(False, False, None)
+
+        theory = self.board_theory(board, line, False)
+        if theory is not None:
+            for assumptions in ([theory.index.id("q")], []):
+                solutions = enumerate_solutions(theory, self.lazy, assumptions)
+                try:
+                    solution = next(solutions, None)
+                finally:
+                    solutions.close()
+                if solution is not None:
+                    return Check(True, solution[("q",)], solution)
+            return Check(False, False, None)
+
+        solution = self._solve([index.id("q")] + literals)
+        if solution is not None:
+            return Check(True, True, solution)
+        solution = self._solve(literals)
+        return Check(solution is not None, False, solution)
+
+    def other_solution(self, board, line, only_solved=True, budget=None):
+        """Returns a solution for a static board with any line other than the given one, or None if that line is the
+        only one (False if the solver gave up after budget conflicts, which doesn't apply to boards with a theory of
+        their own). Like solutions(), the clause ruling out the given line only applies while an activation literal
+        is assumed."""
+        theory = self.board_theory(board, None, only_solved)
+        if theory is not None:
+            theory.add_clause(*[-theory.index.id("c", *connection) for connection in line_connections(line)])
+            solutions = enumerate_solutions(theory, self.lazy)
+            try:
+                return next(solutions, None)
+            finally:
+                solutions.close()
+
+        self.num_vars += 1
+        activation = self.num_vars
+        self.solver.add_clause([-activation] + [-self.cnf.index.id("c", *connection)
+                                                for connection in line_connections(line)])
+        try:
+            return self._solve(static_literals(self.cnf.index, board, None, only_solved) + [activation], budget)
+        finally:
+            self.solver.add_clause([-activation])
+
+    def solutions(self, board=None, line=None, only_solved=True):
+        """Yields every solution for a static board and/or line exactly once (see run.enumerate_solutions()).
+
+        The blocking clauses only apply while a new activation literal is assumed, and that literal is switched off
+        for good once the enumeration ends, so later checks aren't affected."""
+        theory = self.board_theory(board, line, only_solved)
+        if theory is not None:
+            yield from enumerate_solutions(theory, self.lazy)
+            return
+
+        self.num_vars += 1
+        activation = self.num_vars
+        assumptions = static_literals(self.cnf.index, board, line, only_solved) + [activation]
+        projected = [var for kind in PROJECTED_PROPOSITIONS for var in self.cnf.index.ids(kind)]
+        try:
+            while True:
+                solution = self._solve(assumptions)
+                if solution is None:
+                    return
+                #   The model is taken before yielding, since the caller may use the checker in between.
+                model = self.solver.get_model()
+                yield solution
+                self.solver.add_clause([-activation] + [-model[var - 1] for var in projected])
+        finally:
+            self.solver.add_clause([-activation])
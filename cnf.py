@@ -0,0 +1,327 @@
+import json
+from array import array
+from collections import defaultdict, namedtuple
+
+from nnf import NNF, And, Or, Var
+
+#   Propositions that make up a puzzle (see run.py). Every other proposition is fully determined by these, so they're
+#   the ones solutions are told apart by (enumeration, symmetry breaking).
+PROJECTED_PROPOSITIONS = ("s", "e", "l", "c", "w", "b")
+
+
+class VarIndex:
+    """Dense integer IDs for the propositions of a theory. Each kind of proposition (e.g. "c") is registered with a
+    shape (e.g. columns × rows × 2) and gets a contiguous block of IDs, so (kind, x, y[, z]) ↔ ID are both O(1)
+    without storing a Python object or a string per variable."""
+
+    def __init__(self):
+        self.num_vars = 0
+        self.kinds = []  # Kinds in the order they were registered
+        self.bases = {}  # Kind -> first ID of the kind
+        self.shapes = {}  # Kind -> shape
+        self.kind_of = array("B")  # ID - 1 -> position of the ID's kind in self.kinds
+
+    def add(self, kind: str, *shape: int) -> int:
+        """Registers a kind of proposition with the given shape and returns its first ID."""
+        size = 1
+        for length in shape:
+            size *= length
+        self.bases[kind] = self.num_vars + 1
+        self.shapes[kind] = shape
+        self.kind_of.extend([len(self.kinds)] * size)
+        self.kinds.append(kind)
+        self.num_vars += size
+        return self.bases[kind]
+
+    def id(self, kind: str, *coordinates: int) -> int:
+        """Returns the ID of (kind, x, y[, z]). Raises an IndexError for coordinates outside the kind's shape, like
+        indexing its array() would, or for the wrong number of coordinates."""
+        shape = self.shapes[kind]
+        if len(coordinates) != len(shape):
+            raise IndexError(f"({kind}, {', '.join(map(str, coordinates))}) needs {len(shape)} coordinates for "
+                             f"the shape {shape} of {kind}.")
+        offset = 0
+        for coordinate, length in zip(coordinates, shape):
+            if not 0 <= coordinate < length:
+                raise IndexError(f"({kind}, {', '.join(map(str, coordinates))}) is outside the shape {shape} of "
+                                 f"{kind}.")
+            offset = offset * length + coordinate
+        return self.bases[kind] + offset
+
+    def lookup(self, var: int) -> tuple:
+        """Returns the (kind, x, y[, z]) key of an ID."""
+        kind = self.kinds[self.kind_of[var - 1]]
+        offset = var - self.bases[kind]
+        coordinates = []
+        for length in reversed(self.shapes[kind]):
+            offset, coordinate = divmod(offset, length)
+            coordinates.append(coordinate)
+        return (kind, *reversed(coordinates))
+
+    def ids(self, kind: str) -> range:
+        size = 1
+        for length in self.shapes[kind]:
+            size *= length
+        return range(self.bases[kind], self.bases[kind] + size)
+
+    def array(self, kind: str):
+        """Returns the IDs of a kind as nested lists with the kind's shape, so array[x][y] is the ID of (kind, x, y)."""
+        def build(base, shape):
+            if not shape:
+                return base
+            stride = 1
+            for length in shape[1:]:
+                stride *= length
+            return [build(base + n * stride, shape[1:]) for n in range(shape[0])]
+        return build(self.bases[kind], self.shapes[kind])
+
+
+#   Size of a constraint family of a theory: the distinct variables its clauses use (a variable can count towards
+#   several families), its clauses, and the literals in them.
+FamilySize = namedtuple("FamilySize", ["variables", "clauses", "literals"])
+
+
+def family_sizes(families) -> dict:
+    """Adds up the FamilySize of each family from (family, clauses) pairs, with each clause an iterable of literals
+    (or of variables, for the NNF encoder's clauses). Families are kept in the order they first appear."""
+    variables = defaultdict(set)
+    clauses = defaultdict(int)
+    literals = defaultdict(int)
+    for family, family_clauses in families:
+        used = variables[family]
+        for clause in family_clauses:
+            clauses[family] += 1
+            literals[family] += len(clause)
+            used.update(abs(lit) if isinstance(lit, int) else lit for lit in clause)
+    return {family: FamilySize(len(used), clauses[family], literals[family]) for family, used in variables.items()}
+
+
+class CNF:
+    """Clauses in conjunctive normal form over integer literals (a negative literal is a negated variable), ready
+    to be handed straight to a SAT solver.
+
+    The propositions of a theory are the variables of its VarIndex. Auxiliary variables come after them, and are
+    introduced by the Tseitin and cardinality encodings below. Every one of them is fully defined by (equivalent to)
+    the variables it was built from, so the encodings never change the number of solutions of a theory."""
+
+    def __init__(self, index: VarIndex = None):
+        self.index = index if index is not None else VarIndex()
+        self.clauses = []
+        self.num_vars = self.index.num_vars
+        self._false = None
+        self.families = []  # (family, index of its first clause) of every run of clauses added for a family
+        self._family_sizes = None   # Sizes before simplify(), once it's been called
+
+    def aux(self) -> int:
+        """Returns a new auxiliary variable."""
+        self.num_vars += 1
+        return self.num_vars
+
+    def false(self) -> int:
+        """Returns a literal that is always false."""
+        if self._false is None:
+            self._false = self.aux()
+            self.add_clause(-self._false)
+        return self._false
+
+    def add_clause(self, *lits):
+        self.clauses.append(list(lits))
+
+    def copy(self) -> "CNF":
+        """Returns a CNF with the same variables and clauses, that more clauses can be added to separately."""
+        cnf = CNF(self.index)
+        cnf.clauses = list(self.clauses)
+        cnf.num_vars = self.num_vars
+        cnf._false = self._false
+        cnf.families = list(self.families)
+        cnf._family_sizes = self._family_sizes
+        return cnf
+
+    def family(self, name):
+        """Tags the clauses added from now on (until the next call) with a constraint family, see family_sizes()."""
+        self.families.append((name, len(self.clauses)))
+
+    def family_sizes(self) -> dict:
+        """Returns the FamilySize of every constraint family of the theory, as it was built (before simplify()).
+        Clauses added before the first family() are under None."""
+        if self._family_sizes is not None:
+            return self._family_sizes
+        starts = [(None, 0)] + self.families
+        ends = [start for _, start in self.families] + [len(self.clauses)]
+        return family_sizes((family, self.clauses[start:end]) for (family, start), end in zip(starts, ends)
+                            if start < end)
+
+    def simplify(self):
+        """Unit propagation: every variable that the unit clauses force, directly or through clauses that become units
+        in turn, is kept as a unit clause. Clauses that are already satisfied are dropped, and false literals are
+        removed from the rest. If propagation runs into a conflict the clauses are left as they are, so a solver
+        still reports the theory as unsatisfiable."""
+        occurrences = defaultdict(list)  # Literal -> clauses that contain it
+        for clause in self.clauses:
+            for lit in clause:
+                occurrences[lit].append(clause)
+
+        value = {}  # Variable -> literal it is forced to
+        queue = [clause[0] for clause in self.clauses if len(clause) == 1]
+        while queue:
+            lit = queue.pop()
+            if abs(lit) in value:
+                if value[abs(lit)] != lit:
+                    return
+                continue
+            value[abs(lit)] = lit
+            for clause in occurrences[-lit]:
+                if any(value.get(abs(other)) == other for other in clause):
+                    continue
+                undecided = [other for other in clause if abs(other) not in value]
+                if not undecided:
+                    return
+                if len(undecided) == 1:
+                    queue.append(undecided[0])
+
+        residual = [[lit for lit in clause if abs(lit) not in value] for clause in self.clauses
+                    if not any(value.get(abs(lit)) == lit for lit in clause)]
+        self._family_sizes = self.family_sizes()
+        self.clauses = [[lit] for lit in value.values()] + residual
+
+    def compile(self) -> "CNF":
+        """Already compiled. Returns itself so a CNF can be used wherever an Encoding is compiled."""
+        return self
+
+    #   Tseitin definitions:
+
+    def iff_and(self, out: int, lits):
+        """out ↔ lits[0] ∧ lits[1] ∧ …"""
+        for lit in lits:
+            self.add_clause(-out, lit)
+        self.add_clause(out, *[-lit for lit in lits])
+
+    def iff_or(self, out: int, lits):
+        """out ↔ lits[0] ∨ lits[1] ∨ …"""
+        for lit in lits:
+            self.add_clause(out, -lit)
+        self.add_clause(-out, *lits)
+
+    def define_and(self, lits) -> int:
+        """Returns a literal equivalent to lits[0] ∧ lits[1] ∧ …"""
+        if len(lits) == 1:
+            return lits[0]
+        out = self.aux()
+        self.iff_and(out, lits)
+        return out
+
+    def define_or(self, lits) -> int:
+        """Returns a literal equivalent to lits[0] ∨ lits[1] ∨ …"""
+        if len(lits) == 1:
+            return lits[0]
+        out = self.aux()
+        self.iff_or(out, lits)
+        return out
+
+    #   Cardinality encodings:
+
+    def at_least_one(self, lits):
+        self.add_clause(*lits)
+
+    def at_most_one(self, lits, when: int = None):
+        """Sequential counter: each prefix of lits gets a literal that is true when any of the prefix is true, and
+        no literal may be true once its prefix before it already is. With when, the constraint only applies while
+        that literal is true."""
+        condition = [-when] if when is not None else []
+        prefix = lits[0]
+        for lit in lits[1:]:
+            self.add_clause(*condition, -prefix, -lit)
+            prefix = self.define_or([prefix, lit])
+
+    def exactly_one(self, lits):
+        self.at_least_one(lits)
+        self.at_most_one(lits)
+
+    def count(self, lits, k: int) -> list:
+        """Sequential counter: returns literals [≥1, ≥2, …, ≥k] that are true when at least that many of lits are
+        true. Counts that are out of reach are always false."""
+        counts = []  # counts[j] is true when at least j+1 of the literals so far are true.
+        for lit in lits:
+            new_counts = []
+            for j in range(min(k, len(counts) + 1)):
+                carried = self.define_and([counts[j - 1], lit]) if j > 0 else lit
+                new_counts.append(self.define_or([counts[j], carried]) if j < len(counts) else carried)
+            counts = new_counts
+        return counts + [self.false()] * (k - len(counts))
+
+    #   Ordering:
+
+    def lex_less_equal(self, xs, ys):
+        """xs ≤ ys, comparing them as binary numbers with the first literal as the most significant bit. Each pair
+        gets a literal that is true when every pair before it is equal, so a pair can only decrease once an earlier
+        pair has."""
+        pairs = [(x, y) for x, y in zip(xs, ys) if x != y]
+        equal = []  #   Literals true when every pair so far is equal (none before the first pair).
+        for n, (x, y) in enumerate(pairs):
+            self.add_clause(*[-lit for lit in equal], -x, y)
+            if n + 1 < len(pairs):
+                same = self.aux()
+                self.add_clause(-same, -x, y)
+                self.add_clause(-same, x, -y)
+                self.add_clause(same, x, y)
+                self.add_clause(same, -x, -y)
+                equal = [self.define_and(equal + [same])]
+
+    #   Conversions:
+
+    @classmethod
+    def from_nnf(cls, sentence: NNF) -> "CNF":
+        """Converts an NNF sentence to CNF with the Tseitin encoding, if it isn't in CNF already. Propositions that
+        carry a variable of a VarIndex (index and var attributes) keep that variable, and everything else becomes
+        auxiliary."""
+        if not sentence.is_CNF():
+            sentence = sentence.to_CNF()
+        names = sentence.vars()
+        index = next((name.index for name in names if hasattr(name, "index")), None)
+        cnf = cls(index)
+        variables = {name: name.var if hasattr(name, "index") else cnf.aux() for name in names}
+        for clause in sentence:
+            cnf.add_clause(*[variables[var.name] if var.true else -variables[var.name] for var in clause])
+        return cnf
+
+    def to_nnf(self) -> NNF:
+        """Returns the clauses as an NNF sentence over the integer variables, e.g. for
+        bauhaus.utils.count_solutions()."""
+        return And(Or(Var(abs(lit), lit > 0) for lit in clause) for clause in self.clauses)
+
+    def write_dimacs(self, fp):
+        """Writes the clauses in DIMACS format, with the layout of the variable index in a comment line."""
+        layout = [[kind, list(self.index.shapes[kind])] for kind in self.index.kinds]
+        fp.write(f"c index {json.dumps(layout)}\n")
+        fp.write(f"p cnf {self.num_vars} {len(self.clauses)}\n")
+        for clause in self.clauses:
+            fp.write(" ".join(map(str, clause)) + " 0\n")
+
+    @classmethod
+    def read_dimacs(cls, fp) -> "CNF":
+        """Reads clauses written by write_dimacs()."""
+        index = VarIndex()
+        num_vars = 0
+        for line in fp:
+            if line.startswith("c index "):
+                for kind, shape in json.loads(line[len("c index "):]):
+                    index.add(kind, *shape)
+            elif line.startswith("p cnf "):
+                num_vars = int(line.split()[2])
+                break
+        cnf = cls(index)
+        cnf.num_vars = num_vars
+        clause = []
+        for lit in map(int, fp.read().split()):
+            if lit == 0:
+                cnf.clauses.append(clause)
+                clause = []
+            else:
+                clause.append(lit)
+        return cnf
+
+    def decode(self, model) -> dict:
+        """Converts a model (every variable's literal, in order, as returned by a SAT solver) to a dictionary of the
+        value of every proposition, keyed by (kind, x, y[, z])."""
+        lookup = self.index.lookup
+        return {lookup(abs(lit)): lit > 0 for lit in model[:self.index.num_vars]}
@@ -0,0 +1,160 @@
+"""A theory compiled to d-DNNF by dsharp once, and then used for any number of questions without compiling again:
+
+    compiled = DDNNF.compile(TheoryCache().load(2, 2, "binary"))
+    compiled.count(static_literals(compiled.index, only_solved=True))
+    compiled.sample(static_literals(compiled.index, board=board, only_solved=True))
+    for solution in compiled.enumerate([compiled.index.id("s", 0, 0)]):
+        ...
+
+Every question takes time linear in the size of the compiled theory (or less), instead of a dsharp run. Questions
+are asked under assumptions (literals of the theory's variables), e.g. static_literals() of a board or line on top
+of a structural theory, or just "the starting point is at (x, y)".
+
+The compiled theory is smooth, deterministic and decomposable, which is what makes counting, uniform sampling and
+finding the k-th solution (in a fixed order, so solutions can be enumerated and split into ranges) all a single pass
+over it. Every auxiliary variable of a theory is fully defined, so each solution is one puzzle configuration.
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+
+from cnf import VarIndex
+
+#   dsharp on the PATH, or else the one in the repository's bin directory:
+DSHARP = shutil.which("dsharp") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "bin", "dsharp")
+
+#   dsharp's implicit BCP miscounts some theories (see symmetry.count_dsharp()), so it's turned off.
+DSHARP_ARGUMENTS = ["-smoothNNF", "-noIBCP"]
+
+
+class DDNNF:
+    """Nodes of a compiled theory in the order dsharp writes them (children before their parents, root last). Each
+    node is ("L", literal), ("A", children) for a conjunction, or ("O", children) for a disjunction."""
+
+    def __init__(self, index: VarIndex, num_vars: int, nodes: list):
+        self.index = index
+        self.num_vars = num_vars
+        self.nodes = nodes
+
+    @classmethod
+    def compile(cls, cnf, executable=DSHARP) -> "DDNNF":
+        """Compiles a CNF theory with dsharp."""
+        #   dsharp counts unsatisfiable theories as satisfiable, so they're checked with a SAT solver first.
+        if not cnf.to_nnf().satisfiable():
+            return cls(cnf.index, cnf.num_vars, [("O", [])])
+
+        #   Variables that aren't in any clause would be counted as both true and false, so they're fixed to false.
+        used = {abs(lit) for clause in cnf.clauses for lit in clause}
+        unused = [[-var] for var in range(1, cnf.num_vars + 1) if var not in used]
+
+        with tempfile.TemporaryDirectory() as directory:
+            cnf_path = os.path.join(directory, "theory.cnf")
+            nnf_path = os.path.join(directory, "theory.nnf")
+            with open(cnf_path, "w") as fp:
+                fp.write(f"p cnf {cnf.num_vars} {len(cnf.clauses) + len(unused)}\n")
+                for clause in cnf.clauses + unused:
+                    fp.write(" ".join(map(str, clause)) + " 0\n")
+            process = subprocess.run([executable, *DSHARP_ARGUMENTS, "-Fnnf", nnf_path, cnf_path],
+                                     stdout=subprocess.PIPE, universal_newlines=True)
+            if process.returncode != 0 or not os.path.exists(nnf_path):
+                raise Exception(f"dsharp failed with code {process.returncode}:\n{process.stdout}")
+            with open(nnf_path) as fp:
+                nodes = cls.read_nodes(fp)
+        return cls(cnf.index, cnf.num_vars, nodes)
+
+    @staticmethod
+    def read_nodes(fp) -> list:
+        """Reads nodes in the NNF format written by dsharp (and c2d)."""
+        nodes = []
+        for line in fp:
+            kind, *numbers = line.split()
+            if kind == "L":
+                nodes.append(("L", int(numbers[0])))
+            elif kind == "A":
+                nodes.append(("A", [int(child) for child in numbers[1:]]))
+            elif kind == "O":
+                nodes.append(("O", [int(child) for child in numbers[2:]]))
+        return nodes
+
+    def save(self, fp):
+        """Writes the compiled theory, with the layout of its variable index, to a text file."""
+        layout = [[kind, list(self.index.shapes[kind])] for kind in self.index.kinds]
+        fp.write(f"c index {json.dumps(layout)}\n")
+        fp.write(f"nnf {len(self.nodes)} {self.num_vars}\n")
+        for kind, value in self.nodes:
+            if kind == "L":
+                fp.write(f"L {value}\n")
+            else:
+                fp.write(f"{kind} {len(value)} {' '.join(map(str, value))}\n")
+
+    @classmethod
+    def load(cls, fp) -> "DDNNF":
+        """Reads a compiled theory written by save()."""
+        index = VarIndex()
+        for kind, shape in json.loads(fp.readline()[len("c index "):]):
+            index.add(kind, *shape)
+        num_vars = int(fp.readline().split()[2])
+        nodes = []
+        for line in fp:
+            kind, *numbers = line.split()
+            nodes.append(("L", int(numbers[0])) if kind == "L" else (kind, [int(child) for child in numbers[1:]]))
+        return cls(index, num_vars, nodes)
+
+    def counts(self, assumptions=()) -> list:
+        """Returns the number of solutions of every node under the assumptions (the root's is the last)."""
+        excluded = {-lit for lit in assumptions}
+        counts = []
+        for kind, value in self.nodes:
+            if kind == "L":
+                counts.append(0 if value in excluded else 1)
+            elif kind == "A":
+                count = 1
+                for child in value:
+                    count *= counts[child]
+                counts.append(count)
+            else:
+                counts.append(sum(counts[child] for child in value))
+        return counts
+
+    def count(self, assumptions=()) -> int:
+        """Returns the number of solutions under the assumptions."""
+        return self.counts(assumptions)[-1]
+
+    def solution(self, rank: int, counts: list) -> dict:
+        """Returns the solution with the given rank (0 ≤ rank < the root's count), in a fixed order, for the counts
+        of some assumptions. Solutions are dictionaries keyed by (kind, x, y[, z]) like enumerate_solutions()'."""
+        literals = []
+        stack = [(len(self.nodes) - 1, rank)]
+        while stack:
+            node, rank = stack.pop()
+            kind, value = self.nodes[node]
+            if kind == "L":
+                literals.append(value)
+            elif kind == "A":
+                #   The rank is split over the children like the digits of a number with a different base per digit.
+                for child in value:
+                    rank, child_rank = divmod(rank, counts[child])
+                    stack.append((child, child_rank))
+            else:
+                for child in value:
+                    if rank < counts[child]:
+                        stack.append((child, rank))
+                        break
+                    rank -= counts[child]
+        lookup = self.index.lookup
+        return {lookup(abs(lit)): lit > 0 for lit in literals if abs(lit) <= self.index.num_vars}
+
+    def sample(self, assumptions=(), rng=random) -> dict:
+        """Returns a solution under the assumptions picked uniformly at random, or None if there isn't one."""
+        counts = self.counts(assumptions)
+        return self.solution(rng.randrange(counts[-1]), counts) if counts[-1] else None
+
+    def enumerate(self, assumptions=(), start=0, stop=None):
+        """Yields the solutions under the assumptions in order, optionally only those ranked start ≤ rank < stop."""
+        counts = self.counts(assumptions)
+        stop = counts[-1] if stop is None else min(stop, counts[-1])
+        for rank in range(start, stop):
+            yield self.solution(rank, counts)
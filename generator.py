@@ -0,0 +1,144 @@
+"""Generating puzzles: static boards (tiles with starting and ending points) that exactly one line solves.
+
+    python3 generator.py 5 5 --count 100 > puzzles.jsonl
+
+Each candidate is built around a random line, with every region the line separates the tiles into coloured black or
+white, so it always has at least one solution. It's kept only if the solver can't find a solution with any other
+line, which is a single incremental solve per candidate instead of a model count. Candidates are tried in worker
+processes, each with its own BoardChecker (see puzzles.worker_checker()).
+
+Every puzzle is written as a JSON object with the "board" (same format as the board in run.py, and as puzzles.py
+reads) and its "solution" line.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from puzzles import init_worker, worker_checker
+from run import line_connections
+from validator import region_labels, validate
+
+
+def random_line(cols, rows, rng) -> list:
+    """A random self-avoiding walk on the point grid, that stops at a random length of at least cols + rows points
+    (or sooner if it gets stuck)."""
+    length = rng.randint(cols + rows, (cols + 1) * (rows + 1))
+    line = [(rng.randint(0, cols), rng.randint(0, rows))]
+    while len(line) < length:
+        x, y = line[-1]
+        steps = [point for point in ((x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y))
+                 if 0 <= point[0] <= cols and 0 <= point[1] <= rows and point not in line]
+        if not steps:
+            break
+        line.append(rng.choice(steps))
+    return line
+
+
+#   How far the share of black tiles of a puzzle may be from the requested density:
+DENSITY_TOLERANCE = 0.15
+
+
+def random_layout(cols, rows, density, rng):
+    """Returns a random board and a line that solves it. Each region the line separates the tiles into is black with
+    probability density, and white otherwise. None if the share of black tiles isn't within DENSITY_TOLERANCE of
+    density, or every region got the same colour."""
+    line = random_line(cols, rows, rng)
+    labels = region_labels(cols, rows, set(line_connections(line)))
+    colours = {}
+    for label in itertools.chain.from_iterable(labels):
+        if label not in colours:
+            colours[label] = "B" if rng.random() < density else "W"
+    black = sum(colours[label] == "B" for label in itertools.chain.from_iterable(labels)) / (cols * rows)
+    if len(set(colours.values())) < 2 or abs(black - density) > DENSITY_TOLERANCE:
+        return None
+    tiles = [[colours[labels[x][y]] for x in range(cols)] for y in reversed(range(rows))]
+    return [[line[0], line[-1]]] + tiles, line
+
+
+def local_alternatives(line, cols, rows):
+    """Yields lines that differ from a line by one small change: moving a corner to the other side of its square,
+    cutting across three sides of a square, or making a detour around the far side of a square."""
+    on_line = set(line)
+
+    def free(point):
+        return 0 <= point[0] <= cols and 0 <= point[1] <= rows and point not in on_line
+
+    for n in range(len(line) - 1):
+        (x, y), (next_x, next_y) = line[n], line[n + 1]
+        if n + 2 < len(line):
+            (after_x, after_y) = line[n + 2]
+            corner = (x + after_x - next_x, y + after_y - next_y)
+            if x != after_x and y != after_y and free(corner):
+                yield line[:n + 1] + [corner] + line[n + 2:]
+        if n + 3 < len(line) and abs(line[n + 3][0] - x) + abs(line[n + 3][1] - y) == 1:
+            yield line[:n + 1] + line[n + 3:]
+        for side in (-1, 1):
+            d_x, d_y = (side, 0) if x == next_x else (0, side)
+            detour = [(x + d_x, y + d_y), (next_x + d_x, next_y + d_y)]
+            if free(detour[0]) and free(detour[1]):
+                yield line[:n + 1] + detour + line[n + 1:]
+
+
+def find_puzzles(cols, rows, density, seed, attempts, budget) -> list:
+    """Tries the given number of candidates with this worker's checker, and returns the (board, line) of every
+    candidate that only one line solves.
+
+    Most candidates with more than one solution are thrown away before the solver is used, because a small change
+    to their line solves them as well (see local_alternatives()). Candidates that the solver can't decide within
+    budget conflicts are thrown away too."""
+    checker = worker_checker(cols, rows)
+    rng = random.Random(seed)
+    puzzles = []
+    for _ in range(attempts):
+        layout = random_layout(cols, rows, density, rng)
+        if layout is None:
+            continue
+        board, line = layout
+        if any(validate(board, alternative).solved for alternative in local_alternatives(line, cols, rows)):
+            continue
+        if checker.other_solution(board, line, budget=budget) is None:
+            puzzles.append(layout)
+    return puzzles
+
+
+def generate(cols, rows, count, density=0.5, workers=None, seed=None, attempts=64, budget=500):
+    """Yields count puzzles of the given size as (board, line), generated across worker processes. With a seed,
+    the same puzzles are generated in the same order every time. A lower budget (see find_puzzles()) generates
+    puzzles faster, but leans towards the ones that are easiest to prove unique."""
+    workers = workers or os.cpu_count()
+    seed = random.randrange(2 ** 32) if seed is None else seed
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=("binary", None)) as executor:
+        pending = deque()
+        batch = 0
+        try:
+            while count > 0:
+                while len(pending) < 2 * workers:
+                    pending.append(executor.submit(find_puzzles, cols, rows, density, f"{seed}-{batch}", attempts,
+                                                   budget))
+                    batch += 1
+                for puzzle in pending.popleft().result()[:count]:
+                    count -= 1
+                    yield puzzle
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate puzzles that exactly one line solves.")
+    parser.add_argument("cols", type=int)
+    parser.add_argument("rows", type=int)
+    parser.add_argument("--count", type=int, default=10, help="number of puzzles (default: 10)")
+    parser.add_argument("--density", type=float, default=0.5, help="share of black tiles (default: 0.5)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--budget", type=int, default=500, help="solver conflicts per candidate (default: 500)")
+    args = parser.parse_args()
+
+    for board, line in generate(args.cols, args.rows, args.count, args.density, args.workers, args.seed,
+                                budget=args.budget):
+        print(json.dumps({"board": board, "solution": line}, separators=(",", ":")), flush=True)
@@ -0,0 +1,163 @@
+"""Portfolio solving: several configurations (connectivity encoding, SAT solver and symmetry breaking) race on the
+same puzzle in separate processes, and the first one to answer wins. The others are stopped.
+
+    python3 portfolio.py 6 6 --only-solved --log portfolio.jsonl
+    python3 portfolio.py --board '[[[3, 3], [0, 0]], ["B", "W", "W"], ["B", "", "W"], ["B", "W", "W"]]'
+    python3 portfolio.py --summary portfolio.jsonl
+
+Which configuration is fastest depends on the mode and the board size (a static line leaves almost nothing to
+search, while a free board is mostly search), so with --log every race is appended to a JSON Lines file, and
+--summary counts the wins of each configuration per board size and mode, to pick the default from.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import Counter, defaultdict, namedtuple
+from multiprocessing.connection import wait
+
+from run import BlackAndWhiteSquares, INCREMENTAL_SOLVER, parse_board, print_grid, solve
+
+#   symmetry_breaking only applies to free boards (see BlackAndWhiteSquares), so it's skipped for static ones.
+Configuration = namedtuple("Configuration", ["connectivity", "backend", "symmetry_breaking"])
+
+#   Configurations in order of preference: with fewer processes than configurations, the first ones race. Kissat
+#   can't add clauses between solves, so it never runs with lazy connectivity (see enumerate_solutions()).
+PORTFOLIO = [
+    Configuration("binary", INCREMENTAL_SOLVER, False),
+    Configuration("lazy", INCREMENTAL_SOLVER, False),
+    Configuration("binary", "kissat404", False),
+    Configuration("binary", "glucose42", False),
+    Configuration("binary", INCREMENTAL_SOLVER, True),
+    Configuration("distance", INCREMENTAL_SOLVER, False),
+    Configuration("lazy", "maplechrono", False),
+    Configuration("distance", "kissat404", False),
+]
+
+#   solution: the winning configuration's solution (see enumerate_solutions()), or None if there isn't one.
+#   winner: the Configuration that answered first.
+#   seconds: time until the answer, including building the winner's theory.
+#   errors: Configuration -> error of every configuration that failed before the answer came.
+Result = namedtuple("Result", ["solution", "winner", "seconds", "errors"])
+
+
+def applicable(configuration, board, line) -> bool:
+    if configuration.symmetry_breaking and (board or line):
+        return False
+    return not (configuration.backend.startswith("kissat") and configuration.connectivity == "lazy")
+
+
+def _solve_into(connection, configuration, cols, rows, board, line, only_solved):
+    """Runs one configuration in a worker process, and sends back (solution, None) or (None, error)."""
+    try:
+        theory = BlackAndWhiteSquares(cols, rows, board, line, only_solved, configuration.connectivity, "cnf",
+                                      symmetry_breaking=configuration.symmetry_breaking)
+        connection.send((solve(theory.cnf, configuration.connectivity == "lazy", backend=configuration.backend), None))
+    except Exception as error:
+        connection.send((None, repr(error)))
+
+
+def race(cols, rows, board=None, line=None, only_solved=False, configurations=PORTFOLIO, workers=None,
+         timeout=None) -> Result:
+    """Solves a puzzle (same arguments as example_theory()) with the first workers of the configurations that
+    apply to it, each in its own process, and returns the first answer as a Result. Every other process is stopped
+    as soon as there's an answer. Raises an Exception if every configuration fails, or nothing answers within
+    timeout seconds."""
+    configurations = [configuration for configuration in configurations if applicable(configuration, board, line)]
+    configurations = configurations[:workers or os.cpu_count()]
+    if not configurations:
+        raise Exception("None of the configurations apply to this puzzle.")
+
+    start = time.perf_counter()
+    racers = {}  # Receiving end of each process's pipe -> (configuration, process)
+    for configuration in configurations:
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=_solve_into, daemon=True,
+                                          args=(sender, configuration, cols, rows, board, line, only_solved))
+        process.start()
+        sender.close()
+        racers[receiver] = (configuration, process)
+
+    errors = {}
+    try:
+        while len(errors) < len(racers):
+            remaining = None if timeout is None else max(0, timeout - (time.perf_counter() - start))
+            ready = wait([receiver for receiver in racers if racers[receiver][0] not in errors], remaining)
+            if not ready:
+                raise Exception(f"No configuration answered within {timeout}s.")
+            for receiver in ready:
+                configuration, _ = racers[receiver]
+                try:
+                    solution, error = receiver.recv()
+                except EOFError:    #   The process died, e.g. it ran out of memory.
+                    solution, error = None, "exited without an answer"
+                if error is None:
+                    return Result(solution, configuration, time.perf_counter() - start, errors)
+                errors[configuration] = error
+        raise Exception("Every configuration failed: " + "; ".join(f"{configuration}: {error}"
+                                                                   for configuration, error in errors.items()))
+    finally:
+        #   Solvers can't be interrupted from outside, so the losers' processes are stopped instead.
+        for receiver, (_, process) in racers.items():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+            receiver.close()
+
+
+def puzzle_mode(board, line, only_solved) -> int:
+    """The run.py mode of a puzzle."""
+    return 3 if line else 2 if board else 1 if only_solved else 0
+
+
+def log_result(fp, cols, rows, mode, result):
+    """Appends a race's result to an open JSON Lines file."""
+    fp.write(json.dumps({"cols": cols, "rows": rows, "mode": mode, "winner": result.winner._asdict(),
+                         "seconds": result.seconds, "satisfiable": result.solution is not None}) + "\n")
+
+
+def summary(fp) -> dict:
+    """Counts the wins of each configuration in a log written by log_result(), per (cols, rows, mode)."""
+    wins = defaultdict(Counter)
+    for text in fp:
+        entry = json.loads(text)
+        wins[(entry["cols"], entry["rows"], entry["mode"])][Configuration(**entry["winner"])] += 1
+    return wins
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Race solver configurations on a puzzle, and take the first answer.")
+    parser.add_argument("cols", type=int, nargs="?", help="board size (ignored with --board)")
+    parser.add_argument("rows", type=int, nargs="?")
+    parser.add_argument("--board", type=json.loads, help="static board as JSON (same format as in run.py)")
+    parser.add_argument("--line", type=json.loads, help="static line as JSON (same format as in run.py)")
+    parser.add_argument("--only-solved", action="store_true", help="only solved boards (always with --board/--line)")
+    parser.add_argument("--workers", type=int, default=None, help="configurations to race (default: one per core)")
+    parser.add_argument("--timeout", type=float, default=None, help="seconds to wait for an answer")
+    parser.add_argument("--log", help="JSON Lines file to append the result to")
+    parser.add_argument("--summary", help="print the wins per configuration in a log instead of solving")
+    args = parser.parse_args()
+
+    if args.summary:
+        with open(args.summary) as fp:
+            for (cols, rows, mode), wins in sorted(summary(fp).items()):
+                print(f"{cols}x{rows} mode {mode}: " + ", ".join(
+                    f"{configuration.connectivity}/{configuration.backend}"
+                    f"{'/symmetry' if configuration.symmetry_breaking else ''} {count}"
+                    for configuration, count in wins.most_common()))
+    else:
+        cols, rows = args.cols, args.rows
+        if args.board:
+            tiles = parse_board(args.board)[2]
+            cols, rows = len(tiles), len(tiles[0])
+        if cols is None or rows is None:
+            parser.error("cols and rows are needed without --board")
+        only_solved = args.only_solved or bool(args.board or args.line)
+        result = race(cols, rows, args.board, args.line, only_solved, workers=args.workers, timeout=args.timeout)
+        print(f"Winner: {result.winner} in {result.seconds:.3f}s")
+        print(f"Satisfiable: {result.solution is not None}\n")
+        if result.solution: print_grid(result.solution, cols, rows, print_if_solved=True)
+        if args.log:
+            with open(args.log, "a") as fp:
+                log_result(fp, cols, rows, puzzle_mode(args.board, args.line, only_solved), result)
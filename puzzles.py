@@ -0,0 +1,118 @@
+"""Solving files of puzzles across every core:
+
+    python3 puzzles.py puzzles.jsonl > results.jsonl
+    python3 puzzles.py < puzzles.jsonl
+
+Each line of the input is a puzzle as a JSON object with a static "board" (same format as the board in run.py), a
+static "line" (same format as the line in run.py), or both, e.g.
+
+    {"board": [[[3, 3], [0, 0]], ["B", "W", "W"], ["B", "", "W"], ["B", "W", "W"]]}
+
+Puzzles with only a line also need "cols" and "rows". Every worker process keeps a BoardChecker for each board size
+it has seen, so a theory is only built (or loaded from the --cache directory) once per size per worker.
+
+For each puzzle, in the same order as the input, a JSON object is written with "puzzle" (its number), "valid" and
+"solved" (see checker.Check), "board" and "line" of a solved configuration if there is one (otherwise of any valid
+one), and "seconds" spent on it. Puzzles that can't be read get an "error" instead.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from cache import TheoryCache
+from checker import BoardChecker
+from run import BlackAndWhiteSquares
+from stream import decode_solution
+
+#   State of each worker process:
+_checkers = {}  # (cols, rows) -> BoardChecker
+_settings = {}
+
+
+def init_worker(connectivity, cache_directory):
+    _settings["connectivity"] = connectivity
+    _settings["cache"] = TheoryCache(cache_directory) if cache_directory else None
+
+
+def puzzle_size(puzzle) -> tuple:
+    if puzzle.get("board"):
+        return len(puzzle["board"][1]), len(puzzle["board"]) - 1
+    return puzzle["cols"], puzzle["rows"]
+
+
+def worker_checker(cols, rows) -> BoardChecker:
+    """This worker's checker for a board size, built the first time it's needed."""
+    if (cols, rows) not in _checkers:
+        _checkers[(cols, rows)] = BoardChecker(cols, rows, _settings["connectivity"], _settings["cache"])
+    return _checkers[(cols, rows)]
+
+
+def check_puzzle(puzzle) -> dict:
+    """Checks one puzzle with this worker's checker for its size, and returns its result without "seconds"."""
+    cols, rows = puzzle_size(puzzle)
+    valid, solved, solution = worker_checker(cols, rows).check(puzzle.get("board"), puzzle.get("line"))
+    result = {"valid": valid, "solved": solved}
+    if solution is not None:
+        board, line, _ = decode_solution(solution, cols, rows)
+        result.update(board=board, line=line)
+    return result
+
+
+def solve_puzzle(text) -> dict:
+    """Solves one puzzle (a line of the input) with this worker's checker for its size."""
+    start = time.perf_counter()
+    try:
+        result = check_puzzle(json.loads(text))
+    except Exception as error:
+        result = {"error": str(error)}
+    result["seconds"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def solve_puzzles(texts) -> list:
+    return [solve_puzzle(text) for text in texts]
+
+
+def solve_all(lines, workers=None, connectivity="binary", cache_directory=None, chunksize=64):
+    """Yields the result of every puzzle in lines (skipping blank lines) in order. Puzzles are sent to the workers
+    in chunks, and only a few chunks per worker are read ahead, so any number of puzzles can be streamed through."""
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(connectivity, cache_directory)) as executor:
+        pending = deque()
+        chunk = []
+        number = 0
+        for line in lines:
+            if line.strip():
+                chunk.append(line)
+            if len(chunk) == chunksize:
+                pending.append(executor.submit(solve_puzzles, chunk))
+                chunk = []
+            while len(pending) > 2 * workers:
+                for result in pending.popleft().result():
+                    number += 1
+                    yield {"puzzle": number, **result}
+        if chunk:
+            pending.append(executor.submit(solve_puzzles, chunk))
+        while pending:
+            for result in pending.popleft().result():
+                number += 1
+                yield {"puzzle": number, **result}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a file of puzzles, one JSON object per line.")
+    parser.add_argument("puzzles", nargs="?", help="file of puzzles (default: standard input)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--connectivity", default="binary", choices=BlackAndWhiteSquares.CONNECTIVITY_ENCODINGS)
+    parser.add_argument("--cache", metavar="DIRECTORY", help="load and store theories in a TheoryCache directory")
+    parser.add_argument("--chunksize", type=int, default=64, help="puzzles sent to a worker at a time")
+    args = parser.parse_args()
+
+    fp = open(args.puzzles) if args.puzzles else sys.stdin
+    with fp:
+        for result in solve_all(fp, args.workers, args.connectivity, args.cache, args.chunksize):
+            print(json.dumps(result, separators=(",", ":")))
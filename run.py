@@ -1,51 +1,90 @@
+from collections import defaultdict
+
 from nnf import NNF
 from bauhaus import Encoding, proposition, constraint
-from bauhaus.utils import count_solutions
+from pysat.solvers import Solver
+
+from boards import PackedBoard, board_columns
+from cnf import CNF, PROJECTED_PROPOSITIONS, VarIndex, family_sizes
+from ddnnf import DDNNF
+from symmetry import count_unreduced, lex_leader
 
 # These two lines make sure a faster SAT solver is used.
 from nnf import config
 config.sat_backend = "kissat"
 
-# Encoding that will store all the constraints
-E = Encoding()
-
-
-@proposition(E)
-class BasicPropositions:
-    def __init__(self, data):
-        self.data = data
-    def __repr__(self):
-        return f"A.{self.data}"
-
-@constraint.none_of(E)
-@proposition(E)
-class FalseProposition:
-    def __init__(self, data):
-        self.data = data
-    def __repr__(self):
-        return f"A.{self.data}"
-
-
-def generate_2d_array(columns, rows, data):
-    array = []
-    for i in range(columns):
-        row = []
-        for j in range(rows):
-            row.append(BasicPropositions(f"{data}({i},{j})"))
-        array.append(row)
-    return array
-
-def generate_3d_array(x, y, z, data):
-    array = []
-    for i in range(x):
-        row = []
-        for j in range(y):
-            column = []
-            for k in range(z):
-                column.append(BasicPropositions(f"{data}({i},{j},{k})"))
-            row.append(column)
-        array.append(row)
-    return array
+# Incremental SAT solver used whenever clauses are added between solves (kissat can't do this).
+INCREMENTAL_SOLVER = "cadical153"
+
+
+class FamilyEncoding(Encoding):
+    """A bauhaus encoding that tags every constraint with the constraint family it was added for (see
+    BlackAndWhiteSquares.family()), including constraints added through bauhaus.constraint."""
+
+    def __init__(self):
+        super().__init__()
+        self.family = None
+        self.families = {}  # Constraint -> family it was first added for
+        encoding = self
+
+        class Constraints(set):
+            def add(self, item):
+                super().add(item)
+                encoding.families.setdefault(item, encoding.family)
+
+        self.constraints = Constraints()
+
+    def add_constraint(self, constraint: NNF):
+        super().add_constraint(constraint)
+        self.families.setdefault(constraint, self.family)
+
+    def family_sizes(self) -> dict:
+        """Returns the FamilySize (see cnf.py) of every constraint family, counted in the clauses each constraint
+        compiles to on its own (auxiliary variables that compiling the whole theory at once would share between
+        constraints are counted in each of them). The encoding is compiled first if it hasn't been yet."""
+        if not self.debug_constraints:
+            self.compile()
+
+        def clauses(sentence):
+            if not sentence.is_CNF():
+                sentence = sentence.to_CNF()
+            for clause in sentence:
+                yield [literal.name for literal in clause]
+
+        sizes = family_sizes((self.families[constraint], clauses(sentence))
+                             for constraint, sentence in self.debug_constraints.items())
+        return {family: sizes[family] for family in dict.fromkeys(self.families.values()) if family in sizes}
+
+
+def proposition_classes(E: Encoding):
+    """Creates the proposition classes of a theory, registered with the theory's own encoding E. Every theory gets
+    new classes because bauhaus binds a proposition class to a single encoding."""
+
+    @proposition(E)
+    class BasicPropositions:
+        def __init__(self, index, var):
+            self.index = index  #   VarIndex the proposition's variable belongs to
+            self.var = var
+        def __repr__(self):
+            kind, *coordinates = self.index.lookup(self.var)
+            return f"A.{kind}({','.join(map(str, coordinates))})" if coordinates else f"A.{kind}"
+
+    @constraint.none_of(E)
+    @proposition(E)
+    class FalseProposition:
+        def __init__(self, data):
+            self.data = data
+        def __repr__(self):
+            return f"A.{self.data}"
+
+    return BasicPropositions, FalseProposition
+
+
+def generate_propositions(proposition_class, index, ids):
+    """Creates a proposition for every variable ID in the (nested list) array of IDs"""
+    if isinstance(ids, list):
+        return [generate_propositions(proposition_class, index, item) for item in ids]
+    return proposition_class(index, ids)
 
 
 def rotate_matrix_clockwise(matrix):
@@ -58,29 +97,247 @@ def rotate_matrix_clockwise(matrix):
     return new_matrix
 
 
-def print_all_solutions(model: NNF, bruteforce_allowance: int):
-    """Prints every solution of the given model. bruteforce_allowance is the number of total solutions until the
-    function should use model.models() to get all the solutions instead of bruteforcing them all with model.solve()"""
-    num_solutions = count_solutions(model)
-
-    if num_solutions <= bruteforce_allowance:
-        solutions = []
-        for i in range(num_solutions):
-            solution = model.solve()
-            while (solution in solutions):  # Keep finding solutions until it finds one that hasn't already been found.
-                solution = model.solve()
-            solutions.append(solution)
-            print_grid(solution, cols, rows)
-            print(f"Solution # {i + 1}/{num_solutions}")
-            print("-------------------------")
-    else:  # Use model.models() method once solution count gets large enough to make it worth it:
-        solutions = model.models()
-        i = 0
-        for solution in solutions:
-            i += 1
-            print_grid(solution, cols, rows)
-            print(f"Solution # {i}/{num_solutions}")
-            print("-------------------------")
+def parse_board(board):
+    """Splits a static board (or a PackedBoard, see boards.py) into its start point, end point, and tile matrix
+    indexed as tiles[x][y]"""
+    if isinstance(board, PackedBoard):
+        return board.start, board.end, board_columns(board)
+    start, end = board[0]  #   First row of the board is the start and end points.
+    return start, end, rotate_matrix_clockwise(board[1:])  #   Rotate the board matrix so it matches the intended orientation.
+
+
+def empty_tile_groups(tiles) -> list:
+    """Groups of empty tiles of a static board (tiles[x][y]) that are next to each other, as sets of (x, y). Empty
+    tiles without an empty neighbour aren't in any group."""
+    cols, rows = len(tiles), len(tiles[0])
+    groups = []
+    grouped = set()
+    for x in range(cols):
+        for y in range(rows):
+            if tiles[x][y] in ("W", "B") or (x, y) in grouped:
+                continue
+            group = {(x, y)}
+            stack = [(x, y)]
+            while stack:
+                t_x, t_y = stack.pop()
+                for n_x, n_y in ((t_x, t_y + 1), (t_x + 1, t_y), (t_x, t_y - 1), (t_x - 1, t_y)):
+                    if 0 <= n_x < cols and 0 <= n_y < rows and tiles[n_x][n_y] not in ("W", "B") \
+                            and (n_x, n_y) not in group:
+                        group.add((n_x, n_y))
+                        stack.append((n_x, n_y))
+            grouped |= group
+            if len(group) > 1:
+                groups.append(group)
+    return groups
+
+
+def line_connections(line):
+    """Coordinates of every connection along a static line."""
+    connections = []
+    for i in range(len(line)-1):
+        x, y = line[i]
+        next_x, next_y = line[i+1]
+        if y < next_y and x == next_x: #   Connection up:
+            connections.append((x, y, 0))
+        elif x < next_x and y == next_y: #   Connection right:
+            connections.append((x, y, 1))
+        elif next_y < y and x == next_x: #   Connection down:
+            connections.append((next_x, next_y, 0))
+        elif next_x < x and y == next_y: #   Connection left:
+            connections.append((next_x, next_y, 1))
+        else:
+            raise Exception(f"Given static line is not contiguous. Assure each given coordinate only "
+                            "increases by 1 in EITHER the x or y axis from the previous coordinate.\n"
+                            f"Index {i}: ({x},{y}) -> ({next_x},{next_y})")
+    return connections
+
+
+def static_literals(index, board=None, line=None, only_solved=False) -> list:
+    """Literals that fix a static board, a static line and/or that the drawn line must be a solution, for a theory
+    built with the CNF encoder. They are added as unit clauses when a theory is built with them, or can be given to
+    a solver as assumptions on top of a structural theory (see BlackAndWhiteSquares). Raises an IndexError for
+    points or tiles off the index's board."""
+    literals = [index.id("q")] if only_solved else []
+
+    if board:
+        (s_x, s_y), (e_x, e_y), tiles = parse_board(board)
+        literals += [index.id("s", s_x, s_y), index.id("e", e_x, e_y), -index.id("f")]
+        for x, column in enumerate(tiles):
+            for y, tile in enumerate(column):
+                literals.append(index.id("w" if tile == "W" else "b" if tile == "B" else "t", x, y))
+    else:
+        literals.append(index.id("f"))
+
+    if line:
+        literals += static_line_literals(index, line)
+    return literals
+
+
+def static_line_literals(index, line) -> list:
+    """Literals that fix a static line: its start and end points, its line segments and connections (and that there
+    aren't any others), and the distance of every point to the start in the index's distance encoding, if it has
+    one. With all of these fixed, the distance constraints are always satisfied and don't have to be built."""
+    line = [tuple(point) for point in line]
+    cols, rows = index.shapes["l"]
+    positions = defaultdict(list)   #   Point -> distances to the start (more than one if the line revisits it)
+    for distance, point in enumerate(line):
+        positions[point].append(distance)
+    connections = set(line_connections(line))
+
+    literals = [index.id("s", *line[0]), index.id("e", *line[-1])]
+    for x in range(cols):
+        for y in range(rows):
+            distances = positions.get((x, y), [])
+            literals.append(index.id("l", x, y) if distances else -index.id("l", x, y))
+            for z in range(2):
+                literals.append(index.id("c", x, y, z) if (x, y, z) in connections else -index.id("c", x, y, z))
+
+            #   d(i,x,y) is only true for the distance of a point on the line:
+            if "d" in index.bases:
+                for i in range(index.shapes["d"][0]):
+                    literals.append(index.id("d", i, x, y) if i in distances else -index.id("d", i, x, y))
+
+            #   The bits of the distance (0 off the line), and the direction of the previous point on the line:
+            if "r" in index.bases:
+                for distance in distances or [0]:
+                    for k in range(index.shapes["r"][2]):
+                        literals.append(index.id("r", x, y, k) if distance >> k & 1 else -index.id("r", x, y, k))
+                previous = [line[distance - 1] for distance in distances if distance > 0]
+                for direction, neighbour in enumerate([(x, y + 1), (x + 1, y), (x, y - 1), (x - 1, y)]):
+                    literals.append(index.id("a", x, y, direction) if neighbour in previous
+                                    else -index.id("a", x, y, direction))
+    return literals
+
+
+def line_graph(solution: dict):
+    """Returns the starting point of a solution, and a dictionary of the points connected to each point together
+    with the key of the connection, ("c", x, y, z)."""
+    neighbours = defaultdict(list)  # Point -> [(connected point, connection key)]
+    start = None
+    for key, value in solution.items():
+        if not value:
+            continue
+        if key[0] == "s":
+            start = key[1:]
+        elif key[0] == "c":
+            _, x, y, z = key
+            next_point = (x, y + 1) if z == 0 else (x + 1, y)
+            neighbours[(x, y)].append((next_point, key))
+            neighbours[next_point].append(((x, y), key))
+    return start, neighbours
+
+
+def solution_line(solution: dict) -> list:
+    """Returns the points of the line in a solution in order from the starting point to the ending point, in the same
+    format as a static line."""
+    start, neighbours = line_graph(solution)
+    line = [start]
+    previous = None
+    while True:
+        next_points = [point for point, _ in neighbours[line[-1]] if point != previous]
+        if not next_points:
+            return line
+        previous = line[-1]
+        line.append(next_points[0])
+
+
+def find_loops(solution: dict) -> list:
+    """Returns every loop of the line in the given solution that isn't part of the path from the starting point.
+    Each loop is returned as the list of its connections' keys, ("c", x, y, z)."""
+    start, neighbours = line_graph(solution)
+
+    #   Walk every connected group of points, starting with the path from the starting point:
+    loops = []
+    visited = set()
+    for point in [start] + list(neighbours):
+        if point in visited or point not in neighbours:
+            continue
+        connections = set()
+        visited.add(point)
+        stack = [point]
+        while stack:
+            for next_point, connection in neighbours[stack.pop()]:
+                connections.add(connection)
+                if next_point not in visited:
+                    visited.add(next_point)
+                    stack.append(next_point)
+        if point != start:
+            loops.append(list(connections))
+    return loops
+
+
+def solver_stats(solver) -> dict:
+    """The solver's statistics so far, or None if the solver doesn't expose them."""
+    try:
+        return solver.accum_stats()
+    except NotImplementedError:
+        return None
+
+
+def enumerate_solutions(model, lazy=False, assumptions=(), profile=None, backend=INCREMENTAL_SOLVER):
+    """Yields every solution of the given model exactly once. A single incremental solver is kept alive, and after
+    each solution a blocking clause over only the projected puzzle propositions (s, e, l, c, w, b) is added so the
+    same puzzle configuration can never be returned again. The model can be a compiled NNF theory or a CNF, and
+    solutions are returned as dictionaries of the value of every proposition, keyed by (kind, x, y[, z]).
+
+    For theories built with connectivity="lazy", lazy must be True: any solution with loops separate from the line
+    isn't returned, and instead a clause cutting off each of those loops is added before solving again.
+
+    Assumptions are literals that hold for this enumeration only, e.g. static_literals() of a static board.
+
+    profile is an optional profiling hook, called after every solver call with the solver's statistics so far
+    (restarts, conflicts, decisions and propagations), e.g. BlackAndWhiteSquares.profile. It isn't called for
+    solvers that don't expose their statistics (kissat).
+
+    backend is the name of the PySAT solver to use. Solvers that can't add clauses between solves (kissat) only work
+    for finding a single solution of a theory that isn't lazy."""
+    cnf = model if isinstance(model, CNF) else CNF.from_nnf(model)
+    projected = [var for kind in PROJECTED_PROPOSITIONS for var in cnf.index.ids(kind)]
+
+    with Solver(name=backend, bootstrap_with=cnf.clauses) as solver:
+        if profile and solver_stats(solver) is None:
+            profile = None
+        while solver.solve(assumptions=assumptions):
+            if profile: profile(solver_stats(solver))
+            literals = solver.get_model()
+            solution = cnf.decode(literals)
+
+            loops = find_loops(solution) if lazy else []
+            if loops:
+                #   Not every connection in a loop can be used at once:
+                for loop in loops:
+                    solver.add_clause([-cnf.index.id(*connection) for connection in loop])
+                continue
+            yield solution
+
+            #   Block this puzzle configuration:
+            solver.add_clause([-literals[var - 1] for var in projected])
+        if profile: profile(solver_stats(solver))
+
+
+def solve(model, lazy=False, profile=None, backend=INCREMENTAL_SOLVER):
+    """Returns any solution of the given model, or None if there isn't one. See enumerate_solutions() for lazy,
+    profile and backend."""
+    solutions = enumerate_solutions(model, lazy, profile=profile, backend=backend)
+    try:
+        return next(solutions, None)
+    finally:
+        solutions.close()
+
+
+def count(model) -> int:
+    """Counts the solutions of the given model (a compiled NNF theory or a CNF) with dsharp (see ddnnf.DSHARP)."""
+    return DDNNF.compile(model if isinstance(model, CNF) else CNF.from_nnf(model)).count()
+
+
+def print_all_solutions(model, cols: int, rows: int, lazy=False):
+    """Prints every solution of the given model."""
+    num_solutions = 0
+    for solution in enumerate_solutions(model, lazy):
+        num_solutions += 1
+        print_grid(solution, cols, rows)
+        print(f"Solution # {num_solutions}")
+        print("-------------------------")
 
     # Count solutions:
     print(f"# Solutions: {num_solutions}")
@@ -91,9 +348,42 @@ def iff(a, b) -> NNF:
     return (a & b) | (~a & ~b)
 
 
-false = FalseProposition("false")
+def xor(a, b) -> NNF:
+    """Xor helper function"""
+    return (a & ~b) | (~a & b)
+
+
 class BlackAndWhiteSquares:
-    def __init__(self, cols, rows, board, line, only_solved):
+    #   Encodings available for keeping the line a single path from start to end (no separate loops):
+    #   "distance" - one proposition per point per possible distance to the start. Grows as O(P^4) in the number of
+    #                points P, so boards over 4x4 are too complex.
+    #   "binary"   - each point stores its distance to the start as a binary number. Grows as O(P log P), which
+    #                makes boards up to 10x10 practical.
+    #   "lazy"     - no distance constraints at all. Loops separate from the line are cut off during solving
+    #                instead, so the theory must be solved with lazy=True (see enumerate_solutions()).
+    CONNECTIVITY_ENCODINGS = ("distance", "binary", "lazy")
+
+    #   Ways of building the theory:
+    #   "nnf" - NNF constraints added to the bauhaus encoding self.E, which has to be compiled before solving.
+    #   "cnf" - clauses of integer literals emitted straight into self.cnf, ready for a SAT solver.
+    ENCODERS = ("nnf", "cnf")
+
+    #   With structural=True (CNF encoder only), the theory is built without any static board, static line or
+    #   only_solved constraints, so that the same theory can be solved under the static_literals() of any board or
+    #   line of its size as assumptions.
+    #
+    #   With symmetry_breaking=True (CNF encoder and free boards only), only one configuration of every group of
+    #   rotated, reflected or reversed copies is allowed (see symmetry.py).
+    def __init__(self, cols, rows, board, line, only_solved, connectivity="distance", encoder="nnf",
+                 structural=False, symmetry_breaking=False):
+        if connectivity not in self.CONNECTIVITY_ENCODINGS:
+            raise Exception(f"Unknown connectivity encoding \"{connectivity}\". "
+                            f"Use one of: {', '.join(self.CONNECTIVITY_ENCODINGS)}")
+        if encoder not in self.ENCODERS:
+            raise Exception(f"Unknown encoder \"{encoder}\". Use one of: {', '.join(self.ENCODERS)}")
+        if symmetry_breaking and (encoder != "cnf" or board or line or structural):
+            raise Exception("Symmetry breaking needs the CNF encoder, and a free board without a static board or line.")
+
         self.ROWS_TOTAL = rows * 2 + 1
         self.COLUMNS_TOTAL = cols * 2 + 1
 
@@ -103,134 +393,220 @@ class BlackAndWhiteSquares:
         self.ROWS_POINTS = rows + 1
         self.COLUMNS_POINTS = cols + 1
         self.MAX_DIST = self.ROWS_POINTS*self.COLUMNS_POINTS
-
-        self.board = board
+        self.DIST_BITS = max(1, (self.MAX_DIST - 1).bit_length())
+
+        self.static_board = board
+        self.board = None
+        empty_groups = []
+        if board:
+            self.board_start, self.board_end, self.board = parse_board(board)
+            if not structural:
+                empty_groups = empty_tile_groups(self.board)
+
+        #   Through empty tiles of the static board that are next to each other, a black or white square can share a
+        #   region with an empty tile without touching it. It is at most this many steps across empty tiles away (see
+        #   build_region_constraints()):
+        self.joined_empty_tiles = set().union(*empty_groups)
+        self.REGION_STEPS = max(map(len, empty_groups), default=1) - 1
         self.line = line
         self.only_solved = only_solved
+        self.connectivity = connectivity
+        self.encoder = encoder
+        self.structural = structural
+        self.symmetry_breaking = symmetry_breaking
+
+        self.E = None
+        if encoder == "nnf":
+            self.E = FamilyEncoding()  # Encoding that will store all the constraints of this theory
+            self.BasicPropositions, FalseProposition = proposition_classes(self.E)
+            self.false = FalseProposition("false")
 
         # Propositions
-        self.q = BasicPropositions("q")  # True when drawn line is a valid solution
+        self.index = VarIndex()   # Variable ID of every proposition
+        self.q = self.variables("q")  # True when drawn line is a valid solution
+
+        self.w = self.variables("w", self.COLUMNS_TILES, self.ROWS_TILES) # White square
+        self.b = self.variables("b", self.COLUMNS_TILES, self.ROWS_TILES) # Black square
+        self.t = self.variables("t", self.COLUMNS_TILES, self.ROWS_TILES) # Empty square
+        self.j = self.variables("j", self.COLUMNS_TILES, self.ROWS_TILES) # Black square is touching
+        self.k = self.variables("k", self.COLUMNS_TILES, self.ROWS_TILES) # White square is touching
+        self.i = self.variables("i", self.COLUMNS_TILES, self.ROWS_TILES) # Empty  touching a black square and a white square
+        self.p = self.variables("p", self.COLUMNS_TILES, self.ROWS_TILES) # White touching a black square
+        self.s = self.variables("s", self.COLUMNS_POINTS, self.ROWS_POINTS) # Starting point
+        self.e = self.variables("e", self.COLUMNS_POINTS, self.ROWS_POINTS) # Ending point
+        self.l = self.variables("l", self.COLUMNS_POINTS, self.ROWS_POINTS) # Line segment
+        self.c = self.variables("c", self.COLUMNS_POINTS, self.ROWS_POINTS, 2) # Connected - z coordinate is direction of connection {0:up, 1:right}
+        if connectivity == "distance":
+            self.d = self.variables("d", self.MAX_DIST, self.COLUMNS_POINTS, self.ROWS_POINTS) # Distance
+        elif connectivity == "binary":
+            self.r = self.variables("r", self.COLUMNS_POINTS, self.ROWS_POINTS, self.DIST_BITS) # Distance bit - z coordinate is the bit (least significant first)
+            self.a = self.variables("a", self.COLUMNS_POINTS, self.ROWS_POINTS, 4) # Previous point on the line - z coordinate is direction {0:up, 1:right, 2:down, 3:left}
+        if self.REGION_STEPS:
+            self.g = self.variables("g", self.REGION_STEPS, self.COLUMNS_TILES, self.ROWS_TILES, 2) # Black (z=0) or white (z=1) square in the same region, at most n+1 steps across empty tiles away
+        if encoder == "cnf":
+            self.f = self.variables("f") # Free board (not a static board) - at most one empty square
+
+        self.solver_stats = None  # Statistics of the last solver run, given profile as its profiling hook
+        self.cnf = None
+        if encoder == "cnf":
+            self.build_cnf()
+        else:
+            self.build_constraints()
 
-        self.w = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "w") # White square
-        self.b = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "b") # Black square
-        self.t = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "t") # Empty square
-        self.j = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "j") # Black square is touching
-        self.k = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "k") # White square is touching
-        self.i = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "i") # Empty  touching a black square and a white square
-        self.p = generate_2d_array(self.COLUMNS_TILES, self.ROWS_TILES, "p") # White touching a black square
-        self.s = generate_2d_array(self.COLUMNS_POINTS, self.ROWS_POINTS, "s") # Starting point
-        self.e = generate_2d_array(self.COLUMNS_POINTS, self.ROWS_POINTS, "e") # Ending point
-        self.l = generate_2d_array(self.COLUMNS_POINTS, self.ROWS_POINTS, "l") # Line segment
-        self.c = generate_3d_array(self.COLUMNS_POINTS, self.ROWS_POINTS, 2, "c") # Connected - z coordinate is direction of connection {0:up, 1:right}
-        self.d = generate_3d_array(self.MAX_DIST, self.COLUMNS_POINTS, self.ROWS_POINTS, "d") # Distance
 
-        self.build_constraints()
+    def family(self, name):
+        """Tags the constraints added from now on (until the next call) with a constraint family, see
+        family_sizes()."""
+        if self.encoder == "cnf":
+            self.cnf.family(name)
+        else:
+            self.E.family = name
+
+    def family_sizes(self) -> dict:
+        """Returns the variables, clauses and literals of every constraint family of the theory (as FamilySize, see
+        cnf.py), to find which part of the theory grows fastest with the size of the board. For the NNF encoder they
+        are counted in the clauses the constraints compile to."""
+        return self.cnf.family_sizes() if self.encoder == "cnf" else self.E.family_sizes()
+
+    def profile(self, stats):
+        """Profiling hook for enumerate_solutions() and solve(), that keeps the solver's statistics in
+        self.solver_stats."""
+        self.solver_stats = stats
+
+    def proposition(self, var):
+        """Returns the variable (CNF encoder) or proposition (NNF encoder) with the given ID."""
+        kind, *coordinates = self.index.lookup(var)
+        proposition = getattr(self, kind)
+        for coordinate in coordinates:
+            proposition = proposition[coordinate]
+        return proposition
+
+    def variables(self, kind, *shape):
+        """Registers a kind of proposition with the given shape in the variable index, and returns an array of its
+        variables: IDs for the CNF encoder, or propositions carrying those IDs for the NNF encoder."""
+        self.index.add(kind, *shape)
+        ids = self.index.array(kind)
+        return ids if self.encoder == "cnf" else generate_propositions(self.BasicPropositions, self.index, ids)
+
+    def tile_neighbours(self, x, y):
+        """Neighbouring tiles of tile (x, y) and the coordinates of the connection separating them, in the order
+        {up, right, down, left}. None for any neighbour that would be off the board."""
+        return [
+            ((x, y + 1), (x, y + 1, 1)) if y + 1 < self.ROWS_TILES else None,
+            ((x + 1, y), (x + 1, y, 0)) if x + 1 < self.COLUMNS_TILES else None,
+            ((x, y - 1), (x, y, 1)) if y - 1 >= 0 else None,
+            ((x - 1, y), (x, y, 0)) if x - 1 >= 0 else None
+        ]
 
+    def point_neighbours(self, x, y):
+        """Neighbouring points of point (x, y) and the coordinates of the connection to them, in the order
+        {up, right, down, left}. None for any neighbour that would be off the board."""
+        return [
+            ((x, y + 1), (x, y, 0)) if y + 1 < self.ROWS_POINTS else None,
+            ((x + 1, y), (x, y, 1)) if x + 1 < self.COLUMNS_POINTS else None,
+            ((x, y - 1), (x, y - 1, 0)) if y - 1 >= 0 else None,
+            ((x - 1, y), (x - 1, y, 1)) if x - 1 >= 0 else None
+        ]
 
     def build_constraints(self):
 
         #   There can only ever be one starting and end point.
-        constraint.add_exactly_one(E, *self.s)
-        constraint.add_exactly_one(E, *self.e)
+        self.family("start/end")
+        constraint.add_exactly_one(self.E, *self.s)
+        constraint.add_exactly_one(self.E, *self.e)
 
         #   There must always be at least one white and black square.
-        constraint.add_at_least_one(E, *self.w)
-        constraint.add_at_least_one(E, *self.b)
+        self.family("colours")
+        constraint.add_at_least_one(self.E, *self.w)
+        constraint.add_at_least_one(self.E, *self.b)
 
         #   There can be at most one line with any given distance to the start.
-        for i in range(self.MAX_DIST):
-            constraint.add_at_most_one(E, *self.d[i])
+        if self.connectivity == "distance" and not self.line:
+            self.family("distance")
+            for i in range(self.MAX_DIST):
+                constraint.add_at_most_one(self.E, *self.d[i])
 
         #   Static board configuration setup:
         do_static_board = True if self.board else False
         if do_static_board:
-            s_x, s_y = self.board[0][0]
-            e_x, e_y = self.board[0][1]
-            E.add_constraint(self.s[s_x][s_y])
-            E.add_constraint(self.e[e_x][e_y])
-            del self.board[0]   #   Remove the start and end points from the board matrix.
-            self.board = rotate_matrix_clockwise(self.board)    #   Rotate the board matrix so it matches the intended orientation.
+            self.family("static")
+            s_x, s_y = self.board_start
+            e_x, e_y = self.board_end
+            self.E.add_constraint(self.s[s_x][s_y])
+            self.E.add_constraint(self.e[e_x][e_y])
 
         #   Only apply this constraint when not in the static board mode. This allows the static grid to have more than
-        #   one empty tile, as long as the user doesn't put any empty tiles next to each other.
+        #   one empty tile, including empty tiles next to each other (see build_region_constraints()).
         else:
             #   There can be at most one empty space.
-            constraint.add_at_most_one(E, *self.t)
+            self.family("colours")
+            constraint.add_at_most_one(self.E, *self.t)
 
 
         #   Static line configuration setup:
+        #   Every line segment, connection and distance is fixed, so the distance constraints are left out below.
         do_static_line = True if self.line else False
         if do_static_line:
-            E.add_constraint(self.s[self.line[0][0]][self.line[0][1]])
-            E.add_constraint(self.e[self.line[-1][0]][self.line[-1][1]])
-            for i in range(len(self.line)-1):
-                x, y = self.line[i]
-                next_x, next_y = self.line[i+1]
-                E.add_constraint(self.l[x][y])
-                if y < next_y and x == next_x: #   Connection up:
-                    E.add_constraint(self.c[x][y][0])
-                elif x < next_x and y == next_y: #   Connection right:
-                    E.add_constraint(self.c[x][y][1])
-                elif next_y < y and x == next_x: #   Connection down:
-                    E.add_constraint(self.c[next_x][next_y][0])
-                elif next_x < x and y == next_y: #   Connection left:
-                    E.add_constraint(self.c[next_x][next_y][1])
-                else:
-                    raise Exception(f"Given static line is not contiguous. Assure each given coordinate only "
-                                    "increases by 1 in EITHER the x or y axis from the previous coordinate.\n"
-                                    f"Index {i}: ({x},{y}) -> ({next_x},{next_y})")
-            E.add_constraint(self.l[self.line[-1][0]][self.line[-1][1]])
+            self.family("static")
+            for lit in static_line_literals(self.index, self.line):
+                proposition = self.proposition(abs(lit))
+                self.E.add_constraint(proposition if lit > 0 else ~proposition)
 
 
         #   Tile grid loop:
-        empty_touching_bw = false   #   NNF to store if any empty tiles touching both black and white squares.
-        white_touching_b = false    #   NNF to store if any white squares touching black squares.
+        empty_touching_bw = self.false   #   NNF to store if any empty tiles touching both black and white squares.
+        white_touching_b = self.false    #   NNF to store if any white squares touching black squares.
         for x in range(self.COLUMNS_TILES):
             for y in range(self.ROWS_TILES):
 
                 #   If in static board mode:
                 if do_static_board:
+                    self.family("static")
                     tile = self.board[x][y]
                     if tile == "W":
-                        E.add_constraint(self.w[x][y])
+                        self.E.add_constraint(self.w[x][y])
                     elif tile == "B":
-                        E.add_constraint(self.b[x][y])
+                        self.E.add_constraint(self.b[x][y])
                     else:
-                        E.add_constraint(self.t[x][y])
+                        self.E.add_constraint(self.t[x][y])
 
 
                 #   A square is “touching” a black square only when a black square is a single x or y coordinate
                 #   away (no diagonals) and there is no connection between line segments between them.
                 #   j(x,y) ↔ ( b(x,y+1) ∧ ¬c(x,y+1,1) ) ∨ ( b(x+1,y) ∧ ¬c(x+1,y,1) ) ∨ ( b(x,y-1) ∧ ¬c(x,y,1) ) ∨ ( b(x-1,y) ∧ ¬c(x,y,1) )
-                up = self.b[x][y + 1] & ~self.c[x][y+1][1] if y + 1 < self.ROWS_TILES else false
-                right = self.b[x + 1][y] & ~self.c[x+1][y][0] if x + 1 < self.COLUMNS_TILES else false
-                down = self.b[x][y - 1] & ~self.c[x][y][1] if y - 1 >= 0 else false
-                left = self.b[x - 1][y] & ~self.c[x][y][0] if x - 1 >= 0 else false
-                E.add_constraint(iff(self.j[x][y], up | right | down | left))
+                self.family("touching")
+                up = self.b[x][y + 1] & ~self.c[x][y+1][1] if y + 1 < self.ROWS_TILES else self.false
+                right = self.b[x + 1][y] & ~self.c[x+1][y][0] if x + 1 < self.COLUMNS_TILES else self.false
+                down = self.b[x][y - 1] & ~self.c[x][y][1] if y - 1 >= 0 else self.false
+                left = self.b[x - 1][y] & ~self.c[x][y][0] if x - 1 >= 0 else self.false
+                self.E.add_constraint(iff(self.j[x][y], up | right | down | left))
 
                 #   Same idea applies for white squares k(x,y).
-                up = self.w[x][y + 1] & ~self.c[x][y+1][1] if y + 1 < self.ROWS_TILES else false
-                right = self.w[x + 1][y] & ~self.c[x+1][y][0] if x + 1 < self.COLUMNS_TILES else false
-                down = self.w[x][y - 1] & ~self.c[x][y][1] if y - 1 >= 0 else false
-                left = self.w[x - 1][y] & ~self.c[x][y][0] if x - 1 >= 0 else false
-                E.add_constraint(iff(self.k[x][y], up | right | down | left))
+                up = self.w[x][y + 1] & ~self.c[x][y+1][1] if y + 1 < self.ROWS_TILES else self.false
+                right = self.w[x + 1][y] & ~self.c[x+1][y][0] if x + 1 < self.COLUMNS_TILES else self.false
+                down = self.w[x][y - 1] & ~self.c[x][y][1] if y - 1 >= 0 else self.false
+                left = self.w[x - 1][y] & ~self.c[x][y][0] if x - 1 >= 0 else self.false
+                self.E.add_constraint(iff(self.k[x][y], up | right | down | left))
 
                 #   An empty tile is only touching a black square and a white square when the tile has neither
                 #   white nor black on it and the previous constraints for touching black and white squares are met.
                 #   i(x,y) ↔ t(x,y) ∧ j(x,y) ∧ k(x,y)
-                E.add_constraint(iff(self.i[x][y], self.t[x][y] & self.j[x][y] & self.k[x][y]))
+                #   Empty tiles next to other empty tiles look further, see build_region_constraints().
+                if (x, y) not in self.joined_empty_tiles:
+                    self.E.add_constraint(iff(self.i[x][y], self.t[x][y] & self.j[x][y] & self.k[x][y]))
 
                 #   Similar idea applies for white squares touching blacks squares.
                 #   p(x,y) ↔ w(x,y) ∧ j(x,y)
-                E.add_constraint(iff(self.p[x][y], self.w[x][y] & self.j[x][y]))
+                self.E.add_constraint(iff(self.p[x][y], self.w[x][y] & self.j[x][y]))
 
                 #   A square can be exclusively black or white, not both.
                 #   ( w(x,y) → ¬ b(x,y) ) ∧ ( b(x,y) → ¬ w(x,y) )
-                E.add_constraint((self.w[x][y] >> ~self.b[x][y]) & (self.b[x][y] >> ~self.w[x][y]))
+                self.family("colours")
+                self.E.add_constraint((self.w[x][y] >> ~self.b[x][y]) & (self.b[x][y] >> ~self.w[x][y]))
 
                 #   A tile is empty if it doesn't contain a white or black square.
                 #   t(x, y) ↔ ¬b(x, y) ∧ ¬w(x, y)
-                E.add_constraint(iff(self.t[x][y], ~self.b[x][y] & ~self.w[x][y]))
+                self.E.add_constraint(iff(self.t[x][y], ~self.b[x][y] & ~self.w[x][y]))
 
                 #   If there are any empty tiles touching both black and white squares:
                 empty_touching_bw = empty_touching_bw | self.i[x][y]
@@ -240,7 +616,12 @@ class BlackAndWhiteSquares:
         #   A solution is only solved when no empty spaces are touching black and white squares,
         #   and no white squares are touching black squares.
         #   q ↔ ¬( i(0,0) ∨ i(1,0) ∨ i(2,0) ∨ … ∨ i(3,3) ) ∧ ¬( p(0,0) ∨ p(1,)0 ∨ p(2,0) ∨ … ∨ p(3,3) )
-        E.add_constraint(iff(self.q, ~empty_touching_bw & ~white_touching_b))
+        self.family("solved")
+        self.E.add_constraint(iff(self.q, ~empty_touching_bw & ~white_touching_b))
+
+        if self.REGION_STEPS:
+            self.family("touching")
+            self.build_region_constraints()
 
 
         #   Point grid loop:
@@ -248,69 +629,405 @@ class BlackAndWhiteSquares:
             for y in range(self.ROWS_POINTS):
                 # A point can't be both the starting point and ending point.
                 # ¬s(x,y) ∨ ¬e(x,y)
-                E.add_constraint(~self.s[x][y] | ~self.e[x][y])
+                self.family("start/end")
+                self.E.add_constraint(~self.s[x][y] | ~self.e[x][y])
 
                 # There must always be a line segment at the starting point, and ending point.
                 #   s(x,y) → l(x,y)
                 #   e(x,y) → l(x,y)
-                E.add_constraint(self.s[x][y] >> self.l[x][y])
-                E.add_constraint(self.e[x][y] >> self.l[x][y])
+                self.E.add_constraint(self.s[x][y] >> self.l[x][y])
+                self.E.add_constraint(self.e[x][y] >> self.l[x][y])
 
                 #   A point cannot be connected to a non-existent point "out-of-bounds".
                 #   ¬c(x,4,0)
                 #   ¬c(4,y,1)
-                if y + 1 >= self.ROWS_POINTS: E.add_constraint(~self.c[x][y][0])
-                if x + 1 >= self.COLUMNS_POINTS: E.add_constraint(~self.c[x][y][1])
+                self.family("connections")
+                if y + 1 >= self.ROWS_POINTS: self.E.add_constraint(~self.c[x][y][0])
+                if x + 1 >= self.COLUMNS_POINTS: self.E.add_constraint(~self.c[x][y][1])
 
                 #   A point being connected to another point implies that there is a line segment at both ends of the connection.
-                if y + 1 < self.ROWS_POINTS: E.add_constraint(self.c[x][y][0] >> (self.l[x][y] & self.l[x][y+1]))
-                if x + 1 < self.COLUMNS_POINTS: E.add_constraint(self.c[x][y][1] >> (self.l[x][y] & self.l[x+1][y]))
+                if y + 1 < self.ROWS_POINTS: self.E.add_constraint(self.c[x][y][0] >> (self.l[x][y] & self.l[x][y+1]))
+                if x + 1 < self.COLUMNS_POINTS: self.E.add_constraint(self.c[x][y][1] >> (self.l[x][y] & self.l[x+1][y]))
 
                 #   Any point on the line that isn’t the start or end point must be connected to two other points of the line.
                 #   In other words, the line must be a single continuous line from start to end without branching paths.
-                up = self.c[x][y][0] if y + 1 < self.ROWS_POINTS else false
-                right = self.c[x][y][1] if x + 1 < self.COLUMNS_POINTS else false
-                down = self.c[x][y - 1][0] if y - 1 >= 0 else false
-                left = self.c[x - 1][y][1] if x - 1 >= 0 else false
+                self.family("degree")
+                up = self.c[x][y][0] if y + 1 < self.ROWS_POINTS else self.false
+                right = self.c[x][y][1] if x + 1 < self.COLUMNS_POINTS else self.false
+                down = self.c[x][y - 1][0] if y - 1 >= 0 else self.false
+                left = self.c[x - 1][y][1] if x - 1 >= 0 else self.false
                 one_connection = ((up & ~right & ~down & ~left) | (~up & right & ~down & ~left) |
                                   (~up & ~right & down & ~left) | (~up & ~right & ~down & left))
 
                 two_connections = ((up & right & ~down & ~left) | (up & ~right & down & ~left) |
                                    (up & ~right & ~down & left) | (~up & right & down & ~left) |
                                    (~up & right & ~down & left) | (~up & ~right & down & left))
-                E.add_constraint(self.l[x][y] >> (((self.s[x][y] | self.e[x][y]) & one_connection) |
+                self.E.add_constraint(self.l[x][y] >> (((self.s[x][y] | self.e[x][y]) & one_connection) |
                                  (~self.s[x][y] & ~self.e[x][y] & two_connections)))
 
-                #   The distance to the starting point at start must 0.
+                #   The line must be a single path from the starting point, not a path plus separate loops.
+                self.family("distance")
+                if do_static_line:
+                    pass
+                elif self.connectivity == "distance":
+                    self.build_distance_constraints(x, y)
+                elif self.connectivity == "binary":
+                    self.build_binary_distance_constraints(x, y)
+
+        # The solution must be valid.
+        self.family("static")
+        if self.only_solved: self.E.add_constraint(self.q)
+
+        return self.E
+
+
+    def region_step(self, n, x, y, z):
+        """g(n,x,y,z) of build_region_constraints(), where step -1 is j(x,y) (z=0) or k(x,y) (z=1)."""
+        return self.g[n][x][y][z] if n >= 0 else (self.j, self.k)[z][x][y]
+
+    def group_neighbours(self, x, y):
+        """tile_neighbours() of tile (x, y) that are empty tiles of a static board next to other empty tiles."""
+        return [neighbour for neighbour in self.tile_neighbours(x, y)
+                if neighbour is not None and neighbour[0] in self.joined_empty_tiles]
+
+    def build_region_constraints(self):
+        """Region constraints of the empty tiles of a static board that are next to other empty tiles. A black or white
+        square can be in the same region as such a tile without touching it, so the squares touching the empty tiles
+        of a group (j and k) are spread across the group one step at a time, through every side the line doesn't
+        separate. After as many steps as the largest group has tiles (less one), every tile of a group has reached
+        every other tile of its region in the group."""
+        #   g(n,x,y,0) ↔ g(n-1,x,y,0) ∨ ( g(n-1,x,y+1,0) ∧ ¬c(x,y+1,1) ) ∨ ( g(n-1,x+1,y,0) ∧ ¬c(x+1,y,0) ) ∨ …
+        #   for neighbours in the same group, where g(-1,x,y,0) is j(x,y). g(n,x,y,1) is the same for white squares.
+        for n in range(self.REGION_STEPS):
+            for x in range(self.COLUMNS_TILES):
+                for y in range(self.ROWS_TILES):
+                    #   Tiles outside the groups are never used.
+                    if (x, y) not in self.joined_empty_tiles:
+                        self.E.add_constraint(~self.g[n][x][y][0] & ~self.g[n][x][y][1])
+                        continue
+                    for z in range(2):
+                        spread = self.region_step(n - 1, x, y, z)
+                        for (n_x, n_y), (c_x, c_y, c_z) in self.group_neighbours(x, y):
+                            spread = spread | (self.region_step(n - 1, n_x, n_y, z) & ~self.c[c_x][c_y][c_z])
+                        self.E.add_constraint(iff(self.g[n][x][y][z], spread))
+
+        #   i(x,y) ↔ t(x,y) ∧ g(N,x,y,0) ∧ g(N,x,y,1) for the last step N.
+        for x, y in sorted(self.joined_empty_tiles):
+            self.E.add_constraint(iff(self.i[x][y], self.t[x][y] & self.g[-1][x][y][0] & self.g[-1][x][y][1]))
+
+    def build_distance_constraints(self, x, y):
+        """Distance constraints of point (x, y), with a proposition for every possible distance to the start."""
+        #   The distance to the starting point at start must 0.
+        #   s(x,y) → d(x,y,0)
+        self.E.add_constraint(self.s[x][y] >> self.d[0][x][y])
+
+        #   At any line segment there must be another line segment connected
+        #   with a distance less than the specified line segment.
+        for i in range(1, self.MAX_DIST):
+            up = self.c[x][y][0] & self.d[i-1][x][y+1] if y + 1 < self.ROWS_POINTS else self.false
+            right = self.c[x][y][1] & self.d[i-1][x+1][y] if x + 1 < self.COLUMNS_POINTS else self.false
+            down = self.c[x][y-1][0] & self.d[i-1][x][y-1] if y - 1 >= 0 else self.false
+            left = self.c[x-1][y][1] & self.d[i-1][x-1][y] if x - 1 >= 0 else self.false
+            self.E.add_constraint(self.d[i][x][y] >> (up | right | down | left))
+
+        #   Every point with a line segment must have a distance to the start.
+        any_distance = self.false
+        for i in range(self.MAX_DIST):
+            any_distance = any_distance | self.d[i][x][y]
+        self.E.add_constraint(self.l[x][y] >> any_distance)
+
+        #   Every point with a distance can only have one distance at that point.
+        for i in range(self.MAX_DIST):
+            any_other_distance = self.false
+            for j in range(self.MAX_DIST):
+                if j != i: any_other_distance = any_other_distance | self.d[j][x][y]
+            self.E.add_constraint(self.d[i][x][y] >> ~any_other_distance)
+
+
+    def build_binary_distance_constraints(self, x, y):
+        """Distance constraints of point (x, y), with the distance to the start stored as a binary number.
+        Every point on the line other than the start must have a previous point that it is connected to, with a
+        distance exactly one less. Following previous points always reaches the start, so there can't be loops."""
+        bits = self.r[x][y]
+
+        #   The distance at the start, and at any point without a line segment, is 0.
+        #   s(x,y) → ¬r(x,y,k)
+        #   ¬l(x,y) → ¬r(x,y,k)
+        for k in range(self.DIST_BITS):
+            self.E.add_constraint(self.s[x][y] >> ~bits[k])
+            self.E.add_constraint(~self.l[x][y] >> ~bits[k])
+
+        any_previous = self.false
+        for direction, neighbour in enumerate(self.point_neighbours(x, y)):
+            previous = self.a[x][y][direction]
+            if neighbour is None:
+                self.E.add_constraint(~previous)
+                continue
+            (n_x, n_y), (c_x, c_y, c_z) = neighbour
+            connection = self.c[c_x][c_y][c_z]
+            previous_bits = self.r[n_x][n_y]
+
+            #   The previous point must be connected to this point.
+            #   a(x,y,z) → c
+            self.E.add_constraint(previous >> connection)
+
+            #   The distance must be one more than the distance at the previous point (binary increment). The carry
+            #   into bit k is true when all lower bits of the previous distance are true.
+            #   a(x,y,z) → ( r(x,y,k) ↔ r(n,k) ⊕ carry(k) )
+            carry = None
+            for k in range(self.DIST_BITS):
+                if carry is None:
+                    self.E.add_constraint(previous >> iff(bits[k], ~previous_bits[k]))
+                    carry = previous_bits[k]
+                else:
+                    self.E.add_constraint(previous >> iff(bits[k], xor(previous_bits[k], carry)))
+                    carry = carry & previous_bits[k]
+
+            #   The increment can't overflow.
+            self.E.add_constraint(previous >> ~carry)
+
+            any_previous = any_previous | previous
+
+        #   Every point with a line segment other than the start must have a previous point.
+        #   l(x,y) ∧ ¬s(x,y) → a(x,y,0) ∨ a(x,y,1) ∨ a(x,y,2) ∨ a(x,y,3)
+        self.E.add_constraint((self.l[x][y] & ~self.s[x][y]) >> any_previous)
+
+
+    def build_cnf(self):
+        """Builds the same theory as build_constraints(), but emits clauses of integer literals straight into
+        self.cnf. Equivalences get Tseitin definitions and the exactly-one, at-most-one and degree rules use
+        sequential counters, instead of NNF that has to be expanded when it's compiled."""
+        cnf = self.cnf = CNF(self.index)
+
+        def flatten(array):
+            return [lit for item in array for lit in flatten(item)] if isinstance(array, list) else [array]
+
+        q = self.q
+        w, b, t, j, k, i, p = self.w, self.b, self.t, self.j, self.k, self.i, self.p
+        s, e, l, c = self.s, self.e, self.l, self.c
+
+        #   There can only ever be one starting and end point.
+        self.family("start/end")
+        cnf.exactly_one(flatten(s))
+        cnf.exactly_one(flatten(e))
+
+        #   There must always be at least one white and black square.
+        self.family("colours")
+        cnf.at_least_one(flatten(w))
+        cnf.at_least_one(flatten(b))
+
+        #   There can be at most one empty space, unless in static board mode.
+        cnf.at_most_one(flatten(t), when=self.f)
+
+        #   Tile grid loop:
+        not_touching = []   #   Negations of i(x,y) and p(x,y) for every tile.
+        for x in range(self.COLUMNS_TILES):
+            for y in range(self.ROWS_TILES):
+
+                #   j(x,y) ↔ ( b(x,y+1) ∧ ¬c(x,y+1,1) ) ∨ ( b(x+1,y) ∧ ¬c(x+1,y,0) ) ∨ ( b(x,y-1) ∧ ¬c(x,y,1) ) ∨ ( b(x-1,y) ∧ ¬c(x,y,0) )
+                #   k(x,y) is the same for white squares.
+                self.family("touching")
+                black_touching = []
+                white_touching = []
+                for neighbour in self.tile_neighbours(x, y):
+                    if neighbour is not None:
+                        (n_x, n_y), (c_x, c_y, c_z) = neighbour
+                        black_touching.append(cnf.define_and([b[n_x][n_y], -c[c_x][c_y][c_z]]))
+                        white_touching.append(cnf.define_and([w[n_x][n_y], -c[c_x][c_y][c_z]]))
+                cnf.iff_or(j[x][y], black_touching)
+                cnf.iff_or(k[x][y], white_touching)
+
+                #   i(x,y) ↔ t(x,y) ∧ j(x,y) ∧ k(x,y)
+                #   Empty tiles next to other empty tiles look further, see build_region_cnf().
+                if (x, y) not in self.joined_empty_tiles:
+                    cnf.iff_and(i[x][y], [t[x][y], j[x][y], k[x][y]])
+
+                #   p(x,y) ↔ w(x,y) ∧ j(x,y)
+                cnf.iff_and(p[x][y], [w[x][y], j[x][y]])
+
+                #   ¬w(x,y) ∨ ¬b(x,y)
+                self.family("colours")
+                cnf.add_clause(-w[x][y], -b[x][y])
+
+                #   t(x, y) ↔ ¬b(x, y) ∧ ¬w(x, y)
+                cnf.iff_and(t[x][y], [-b[x][y], -w[x][y]])
+
+                not_touching += [-i[x][y], -p[x][y]]
+
+        #   q ↔ ¬( i(0,0) ∨ i(1,0) ∨ … ) ∧ ¬( p(0,0) ∨ p(1,0) ∨ … )
+        self.family("solved")
+        cnf.iff_and(q, not_touching)
+
+        if self.REGION_STEPS:
+            self.family("touching")
+            self.build_region_cnf()
+
+        #   Point grid loop:
+        for x in range(self.COLUMNS_POINTS):
+            for y in range(self.ROWS_POINTS):
+                #   ¬s(x,y) ∨ ¬e(x,y)
+                self.family("start/end")
+                cnf.add_clause(-s[x][y], -e[x][y])
+
+                #   s(x,y) → l(x,y)
+                #   e(x,y) → l(x,y)
+                cnf.add_clause(-s[x][y], l[x][y])
+                cnf.add_clause(-e[x][y], l[x][y])
+
+                #   A point cannot be connected to a non-existent point "out-of-bounds".
+                self.family("connections")
+                if y + 1 >= self.ROWS_POINTS: cnf.add_clause(-c[x][y][0])
+                if x + 1 >= self.COLUMNS_POINTS: cnf.add_clause(-c[x][y][1])
+
+                #   A point being connected to another point implies that there is a line segment at both ends of the connection.
+                if y + 1 < self.ROWS_POINTS:
+                    cnf.add_clause(-c[x][y][0], l[x][y])
+                    cnf.add_clause(-c[x][y][0], l[x][y+1])
+                if x + 1 < self.COLUMNS_POINTS:
+                    cnf.add_clause(-c[x][y][1], l[x][y])
+                    cnf.add_clause(-c[x][y][1], l[x+1][y])
+
+                #   The start and end points are connected to exactly one other point, and every other point on the
+                #   line to exactly two.
+                self.family("degree")
+                connections = [c[c_x][c_y][c_z] for _, (c_x, c_y, c_z) in filter(None, self.point_neighbours(x, y))]
+                at_least_one, at_least_two, at_least_three = cnf.count(connections, 3)
+                end = cnf.define_or([s[x][y], e[x][y]])
+                cnf.add_clause(-l[x][y], at_least_one)
+                cnf.add_clause(-l[x][y], -at_least_three)
+                cnf.add_clause(-l[x][y], -end, -at_least_two)
+                cnf.add_clause(-l[x][y], end, at_least_two)
+
+        #   The line must be a single path from the starting point, not a path plus separate loops. A static line
+        #   fixes every distance (see static_line_literals()), so the distance constraints are left out.
+        self.family("distance")
+        if self.line and not self.structural:
+            pass
+        elif self.connectivity == "distance":
+            self.build_distance_cnf(s, l, c)
+        elif self.connectivity == "binary":
+            self.build_binary_distance_cnf(s, l, c)
+
+        #   Only the smallest of every group of symmetric configurations:
+        if self.symmetry_breaking:
+            self.family("symmetry")
+            lex_leader(cnf, self.COLUMNS_TILES, self.ROWS_TILES)
+
+        #   Static board, static line, and the solution must be valid:
+        if not self.structural:
+            self.family("static")
+            for lit in static_literals(self.index, self.static_board, self.line, self.only_solved):
+                cnf.add_clause(lit)
+
+            #   Only keep what the static board and line leave undecided:
+            cnf.simplify()
+
+        return cnf
+
+
+    def build_region_cnf(self):
+        """CNF version of build_region_constraints()."""
+        cnf = self.cnf
+        g, c = self.g, self.c
+        for n in range(self.REGION_STEPS):
+            for x in range(self.COLUMNS_TILES):
+                for y in range(self.ROWS_TILES):
+                    if (x, y) not in self.joined_empty_tiles:
+                        cnf.add_clause(-g[n][x][y][0])
+                        cnf.add_clause(-g[n][x][y][1])
+                        continue
+                    for z in range(2):
+                        spread = [self.region_step(n - 1, x, y, z)]
+                        for (n_x, n_y), (c_x, c_y, c_z) in self.group_neighbours(x, y):
+                            spread.append(cnf.define_and([self.region_step(n - 1, n_x, n_y, z), -c[c_x][c_y][c_z]]))
+                        cnf.iff_or(g[n][x][y][z], spread)
+
+        for x, y in sorted(self.joined_empty_tiles):
+            cnf.iff_and(self.i[x][y], [self.t[x][y], g[-1][x][y][0], g[-1][x][y][1]])
+
+    def build_distance_cnf(self, s, l, c):
+        """CNF version of build_distance_constraints() for every point."""
+        cnf = self.cnf
+        d = self.d
+
+        #   There can be at most one line with any given distance to the start.
+        for i in range(self.MAX_DIST):
+            cnf.at_most_one([lit for column in d[i] for lit in column])
+
+        for x in range(self.COLUMNS_POINTS):
+            for y in range(self.ROWS_POINTS):
                 #   s(x,y) → d(x,y,0)
-                E.add_constraint(self.s[x][y] >> self.d[0][x][y])
+                cnf.add_clause(-s[x][y], d[0][x][y])
 
-                #   At any line segment there must be another line segment connected
-                #   with a distance less than the specified line segment.
+                #   A point at distance i must be connected to a point at distance i - 1.
+                neighbours = list(filter(None, self.point_neighbours(x, y)))
                 for i in range(1, self.MAX_DIST):
-                    up = self.c[x][y][0] & self.d[i-1][x][y+1] if y + 1 < self.ROWS_POINTS else false
-                    right = self.c[x][y][1] & self.d[i-1][x+1][y] if x + 1 < self.COLUMNS_POINTS else false
-                    down = self.c[x][y-1][0] & self.d[i-1][x][y-1] if y - 1 >= 0 else false
-                    left = self.c[x-1][y][1] & self.d[i-1][x-1][y] if x - 1 >= 0 else false
-                    E.add_constraint(self.d[i][x][y] >> (up | right | down | left))
-
-                #   Every point with a line segment must have a distance to the start.
-                any_distance = false
-                for i in range(self.MAX_DIST):
-                    any_distance = any_distance | self.d[i][x][y]
-                E.add_constraint(self.l[x][y] >> any_distance)
-
-                #   Every point with a distance can only have one distance at that point.
-                for i in range(self.MAX_DIST):
-                    any_other_distance = false
-                    for j in range(self.MAX_DIST):
-                        if j != i: any_other_distance = any_other_distance | self.d[j][x][y]
-                    E.add_constraint(self.d[i][x][y] >> ~any_other_distance)
+                    previous = [cnf.define_and([c[c_x][c_y][c_z], d[i-1][n_x][n_y]])
+                                for (n_x, n_y), (c_x, c_y, c_z) in neighbours]
+                    cnf.add_clause(-d[i][x][y], *previous)
 
-        # The solution must be valid.
-        if self.only_solved: E.add_constraint(self.q)
+                #   Every point with a line segment has exactly one distance to the start.
+                distances = [d[i][x][y] for i in range(self.MAX_DIST)]
+                cnf.add_clause(-l[x][y], *distances)
+                cnf.at_most_one(distances)
+
+
+    def build_binary_distance_cnf(self, s, l, c):
+        """CNF version of build_binary_distance_constraints() for every point."""
+        cnf = self.cnf
+        r, a = self.r, self.a
+
+        #   carries[x][y][k] is true when the lowest k bits of the distance at (x, y) are all true, which is the carry
+        #   into bit k when adding one to that distance (carries[x][y][0] is always true, so it's left as None).
+        carries = [[[None] for y in range(self.ROWS_POINTS)] for x in range(self.COLUMNS_POINTS)]
+        for x in range(self.COLUMNS_POINTS):
+            for y in range(self.ROWS_POINTS):
+                carry = r[x][y][0]
+                carries[x][y].append(carry)
+                for k in range(1, self.DIST_BITS):
+                    carry = cnf.define_and([carry, r[x][y][k]])
+                    carries[x][y].append(carry)
+
+        for x in range(self.COLUMNS_POINTS):
+            for y in range(self.ROWS_POINTS):
+                bits = r[x][y]
+
+                #   s(x,y) → ¬r(x,y,k)
+                #   ¬l(x,y) → ¬r(x,y,k)
+                for k in range(self.DIST_BITS):
+                    cnf.add_clause(-s[x][y], -bits[k])
+                    cnf.add_clause(l[x][y], -bits[k])
+
+                any_previous = []
+                for direction, neighbour in enumerate(self.point_neighbours(x, y)):
+                    previous = a[x][y][direction]
+                    if neighbour is None:
+                        cnf.add_clause(-previous)
+                        continue
+                    (n_x, n_y), (c_x, c_y, c_z) = neighbour
+                    previous_bits = r[n_x][n_y]
+
+                    #   a(x,y,z) → c
+                    cnf.add_clause(-previous, c[c_x][c_y][c_z])
+
+                    #   a(x,y,z) → ( r(x,y,k) ↔ r(n,k) ⊕ carry(k) )
+                    cnf.add_clause(-previous, bits[0], previous_bits[0])
+                    cnf.add_clause(-previous, -bits[0], -previous_bits[0])
+                    for k in range(1, self.DIST_BITS):
+                        carry = carries[n_x][n_y][k]
+                        cnf.add_clause(-previous, -bits[k], previous_bits[k], carry)
+                        cnf.add_clause(-previous, bits[k], -previous_bits[k], carry)
+                        cnf.add_clause(-previous, bits[k], previous_bits[k], -carry)
+                        cnf.add_clause(-previous, -bits[k], -previous_bits[k], -carry)
+
+                    #   The increment can't overflow.
+                    cnf.add_clause(-previous, -carries[n_x][n_y][self.DIST_BITS])
+
+                    any_previous.append(previous)
+
+                #   l(x,y) ∧ ¬s(x,y) → a(x,y,0) ∨ a(x,y,1) ∨ a(x,y,2) ∨ a(x,y,3)
+                cnf.add_clause(-l[x][y], s[x][y], *any_previous)
 
-        return E
 
 def print_grid(s: dict, cols: int, rows: int, print_if_solved = False):
     ROWS = rows * 2 + 1
@@ -322,7 +1039,7 @@ def print_grid(s: dict, cols: int, rows: int, print_if_solved = False):
     #   Iterate over the s dictionary:
     for key, value in s.items():
 
-        prop = key.data[0]  # Get proposition type from dict s
+        prop, *coordinates = key  # Get proposition type and coordinates from the key, e.g. ("c", x, y, z)
 
         if print_if_solved and prop == "q":
             if value:
@@ -331,30 +1048,29 @@ def print_grid(s: dict, cols: int, rows: int, print_if_solved = False):
                 print("NOT SOLVED")
             continue
 
-        if len(key.data) <= 2:
-            continue
-
         #   If the value of the proposition is true, modify the grid matrix:
         if value:
 
             #   Depending on the proposition type, replace the string in the grid matrix:
-            if prop != "d":
-                x = int(key.data[2])
-                y = int(key.data[4])
-                if prop == "s":
-                    grid[2 * x][2 * y] = " S "
-                elif prop == "e":
-                    grid[2 * x][2 * y] = " E "
-                elif prop == "w":
-                    grid[2 * x + 1][2 * y + 1] = " W "
-                elif prop == "b":
-                    grid[2 * x + 1][2 * y + 1] = " B "
-                elif prop == "l" and grid[2 * x][2 * y] == "   ":
-                    grid[2 * x][2 * y] = " * "
-                elif prop == "c":
-                    z = int(key.data[6])
-                    if z == 1: grid[2 * x + 1][2 * y] = "---"
-                    else: grid[2 * x][2 * y + 1] = " | "
+            if prop == "s":
+                x, y = coordinates
+                grid[2 * x][2 * y] = " S "
+            elif prop == "e":
+                x, y = coordinates
+                grid[2 * x][2 * y] = " E "
+            elif prop == "w":
+                x, y = coordinates
+                grid[2 * x + 1][2 * y + 1] = " W "
+            elif prop == "b":
+                x, y = coordinates
+                grid[2 * x + 1][2 * y + 1] = " B "
+            elif prop == "l":
+                x, y = coordinates
+                if grid[2 * x][2 * y] == "   ": grid[2 * x][2 * y] = " * "
+            elif prop == "c":
+                x, y, z = coordinates
+                if z == 1: grid[2 * x + 1][2 * y] = "---"
+                else: grid[2 * x][2 * y + 1] = " | "
 
     #   Print the grid matrix:
     for y in range(ROWS-1, -1, -1):
@@ -363,23 +1079,39 @@ def print_grid(s: dict, cols: int, rows: int, print_if_solved = False):
         print()
 
 
-def example_theory(cols = 3, rows = 3, board = None, line = None, only_solved=False):
-    bws_class = BlackAndWhiteSquares(cols, rows, board, line, only_solved)
-    return E
+def parse_size(text) -> tuple:
+    """Reads a board size such as "5x4" as (cols, rows), for command line arguments."""
+    cols, rows = text.lower().split("x")
+    return int(cols), int(rows)
+
+
+#   Mode descriptions:
+MODES = {
+    0 : "Find any valid board",
+    1 : "Find any solved board",
+    2 : "Static tiles",
+    3 : "Static line"
+}
+
+
+def example_theory(cols = 3, rows = 3, board = None, line = None, only_solved=False, connectivity="distance",
+                   encoder="nnf", symmetry_breaking=False):
+    bws_class = BlackAndWhiteSquares(cols, rows, board, line, only_solved, connectivity, encoder,
+                                     symmetry_breaking=symmetry_breaking)
+    return bws_class.cnf if encoder == "cnf" else bws_class.E
 
 
 #   Main:
 if __name__ == "__main__":
     mode = 0    #   <--------------- Change program mode here (0, 1, 2, or 3)
+    connectivity = "distance"   #   <--- Change to "binary" or "lazy" for boards larger than 4x4
+    lazy = connectivity == "lazy"
+    encoder = "cnf"     #   <--- Change to "nnf" to build the theory with bauhaus instead
+    symmetry_breaking = False   #   <--- Change to True to skip rotated, reflected and reversed copies in modes 0 and 1 (CNF encoder only)
+
+    print(f"Mode: {MODES[mode]}")
 
-    #   Mode descriptions:
-    mode_dict = {
-        0 : "Find any valid board",
-        1 : "Find any solved board",
-        2 : "Static tiles",
-        3 : "Static line"
-    }
-    print(f"Mode: {mode_dict[mode]}")
+    from cache import TheoryCache  #   Imported here since cache.py imports this module.
 
     #   Find any valid model, state if the board is solved:
     if mode == 0:
@@ -387,15 +1119,21 @@ if __name__ == "__main__":
         cols = 3
         rows = 3
 
-        T = example_theory(cols, rows)  #   Create theory.
+        T = example_theory(cols, rows, connectivity=connectivity, encoder=encoder,
+                           symmetry_breaking=symmetry_breaking)  #   Create theory.
         T = T.compile()    #    Compile theory.
 
-        print("Satisfiable: %s\n" % T.satisfiable())
-        solution = T.solve()
+        solution = solve(T, lazy)
+        print("Satisfiable: %s\n" % (solution is not None))
         if solution: print_grid(solution, cols, rows, print_if_solved=True)
 
-        # Count solutions (Runs only if grid size is <= 2x2):
-        if cols <= 2 and rows <= 2: print("# Solutions: %d" % count_solutions(T))
+        # Count solutions (Runs only if grid size is <= 3x2, and loops aren't cut off lazily):
+        if not lazy and cols * rows <= 6 and not symmetry_breaking:
+            #   The compiled theory is cached on disk, so only the first count of each size compiles it.
+            compiled = TheoryCache().load_compiled(cols, rows, connectivity)
+            print("# Solutions: %d" % compiled.count(static_literals(compiled.index)))
+        elif not lazy and cols <= 2 and rows <= 2:
+            print("# Solutions: %d" % count_unreduced(T, cols, rows))
 
 
     #   Find any solved model:
@@ -404,48 +1142,46 @@ if __name__ == "__main__":
         cols = 3
         rows = 3
 
-        T = example_theory(cols, rows, only_solved=True)  #   Create theory.
+        T = example_theory(cols, rows, only_solved=True, connectivity=connectivity, encoder=encoder,
+                           symmetry_breaking=symmetry_breaking)  #   Create theory.
         T = T.compile()    #    Compile theory.
 
-        print("Satisfiable: %s\n" % T.satisfiable())
-        solution = T.solve()
+        solution = solve(T, lazy)
+        print("Satisfiable: %s\n" % (solution is not None))
         if solution: print_grid(solution, cols, rows)
 
-        # Count solutions (Runs only if grid size is <= 2x2):
-        if cols <= 2 and rows <= 2: print("# Solutions: %d" % count_solutions(T))
+        # Count solutions (Runs only if grid size is <= 3x2, and loops aren't cut off lazily):
+        if not lazy and cols * rows <= 6 and not symmetry_breaking:
+            #   The compiled theory is cached on disk, so only the first count of each size compiles it.
+            compiled = TheoryCache().load_compiled(cols, rows, connectivity)
+            print("# Solutions: %d" % compiled.count(static_literals(compiled.index, only_solved=True)))
+        elif not lazy and cols <= 2 and rows <= 2:
+            print("# Solutions: %d" % count_unreduced(T, cols, rows))
 
 
     #   Solutions with static tiles:
     elif mode == 2:
-        #   Do NOT modify board size in this mode. Should always be 3x3.
-        cols = 3
-        rows = 3
-
-        #   Modify matrix for different static tile configurations:
+        #   Modify matrix for different static tile configurations, of any size and with any number of empty tiles:
         #   First tuple is starting point location
         #   Second tuple is ending point location
+        #   Boards can also be loaded from a file packed with boards.py, e.g. next(read_boards(fp)).
         board = [
             [(3,3), (0,0)],
             ["B", "W", "W"],
             ["B", "", "W"],
             ["B", "W", "W"]
         ]
-        #   Be careful not to put two empty tiles next to directly each other.
-        #   The constraints cannot properly check for squares of differing colours
-        #   in the same section if there are any empty tiles touching one another.
+        tiles = parse_board(board)[2]
+        cols = len(tiles)
+        rows = len(tiles[0])
 
 
-        T = example_theory(cols, rows, board=board, only_solved=True)  #   Create theory.
+        T = example_theory(cols, rows, board=board, only_solved=True, connectivity=connectivity, encoder=encoder)  #   Create theory.
         T = T.compile()    #    Compile theory.
 
-        print("Satisfiable: %s\n" % T.satisfiable())
+        print("Satisfiable: %s\n" % (solve(T, lazy) is not None))
 
-        #   Using T.models() to list all the solutions to the model is significantly slower
-        #   when calculating all line configurations with a static board as compared to how
-        #   fast it is when calculating all square configurations with a static line. Using
-        #   the T.models() method probably wouldn't see any gains in speed until the total
-        #   number of solutions reaches about 60.
-        print_all_solutions(T, 60)
+        print_all_solutions(T, cols, rows, lazy)
 
 
     #   Solutions with static line:
@@ -471,16 +1207,10 @@ if __name__ == "__main__":
             (1, 3)
         ]
 
-        T = example_theory(cols, rows, line=line, only_solved=True)  #   Create theory.
+        T = example_theory(cols, rows, line=line, only_solved=True, connectivity=connectivity, encoder=encoder)  #   Create theory.
         T = T.compile()    #    Compile theory.
 
-        #   Only calculate if grid size doesn't exceed 4x4 (the model gets too complex to calculate):
-        if cols <= 4 and rows <= 4:
-            print("Satisfiable: %s\n" % T.satisfiable())
-
-            #   model.models() method is much faster here than it is when listing all the possible
-            #   line configurations, so the number of total solutions to make it worth it
-            #   is much lower.
-            print_all_solutions(T, 10)
+        print("Satisfiable: %s\n" % (solve(T, lazy) is not None))
+        print_all_solutions(T, cols, rows, lazy)
 
     print()
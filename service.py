@@ -0,0 +1,232 @@
+"""Long-running solver service, so that checking a puzzle doesn't pay for starting Python, importing the solvers and
+building a theory every time:
+
+    python3 service.py --warm 5x5 8x8                           # JSON Lines on standard input/output
+    python3 service.py --socket /tmp/squares.sock --warm 5x5    # JSON Lines over a Unix socket
+
+Every request is a JSON object on its own line with an "op", and the puzzle in the same format as puzzles.py reads
+("board", "line", or both, with "cols" and "rows" for a line on its own). An optional "id" is copied into the
+response, since responses come back in the order they're answered, not the order they were sent.
+
+    {"id": 1, "op": "verify", "board": [...], "line": [...]}    -> {"id": 1, "valid": true, "solved": true}
+    {"id": 2, "op": "solve", "board": [...]}                    -> {"id": 2, "valid": true, "solved": true,
+                                                                    "board": [...], "line": [...]}
+    {"id": 3, "op": "enumerate", "board": [...], "limit": 10}  -> {"id": 3, "solutions": [{"board": [...],
+                                                                    "line": [...]}, ...], "complete": true}
+
+verify checks a drawn line with validator.validate() in the service itself. solve (see puzzles.py) and enumerate
+(solved configurations only, unless "only_solved" is false) run in worker processes, each keeping a BoardChecker
+with a warm incremental solver for every board size it has seen, and for every --warm size from the start. At most
+--queue requests wait for a worker; once the queue is full, the service stops reading requests until there's room.
+Failed requests get an "error" instead. Every response has the "seconds" the request took, including waiting.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from puzzles import check_puzzle, init_worker, puzzle_size, worker_checker
+from run import BlackAndWhiteSquares, parse_size
+from stream import decode_solution
+from validator import validate
+
+OPERATIONS = ("verify", "solve", "enumerate")
+
+#   Most solutions an enumerate request returns, if it doesn't ask for fewer:
+ENUMERATE_LIMIT = 1000
+
+#   Longest request line in bytes that a socket connection accepts:
+LINE_LIMIT = 16 * 1024 * 1024
+
+
+def init_service_worker(connectivity, cache_directory, sizes):
+    """Sets up a worker process, with checkers for the given board sizes built up front."""
+    init_worker(connectivity, cache_directory)
+    for cols, rows in sizes:
+        worker_checker(cols, rows)
+
+
+def answer(request) -> dict:
+    """Answers a solve or enumerate request with this worker's checker (without "id" and "seconds")."""
+    if request["op"] == "solve":
+        return check_puzzle(request)
+
+    cols, rows = puzzle_size(request)
+    limit = min(request.get("limit", ENUMERATE_LIMIT), ENUMERATE_LIMIT)
+    solutions = worker_checker(cols, rows).solutions(request.get("board"), request.get("line"),
+                                                     request.get("only_solved", True))
+    found = []
+    try:
+        for solution in itertools.islice(solutions, limit + 1):
+            board, line, _ = decode_solution(solution, cols, rows)
+            found.append({"board": board, "line": line})
+    finally:
+        solutions.close()   #   Ends the enumeration in the checker right away.
+    return {"solutions": found[:limit], "complete": len(found) <= limit}
+
+
+class Service:
+    """Answers requests from any number of streams with a shared pool of worker processes. Use it as an async
+    context manager, and serve() each stream of requests."""
+
+    def __init__(self, workers=None, connectivity="binary", cache_directory=None, warm=(), queue_size=256):
+        self.workers = workers or os.cpu_count()
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_service_worker,
+                                            initargs=(connectivity, cache_directory, list(warm)))
+        self.queue_size = queue_size
+        self.queue = None
+        self.consumers = []
+
+    async def __aenter__(self):
+        #   Worker processes start when they're first needed, so they're all started now, and the --warm sizes are
+        #   built before the first request comes in.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, os.getpid) for _ in range(self.workers)))
+
+        #   One consumer per worker, so requests wait in the bounded queue rather than in the executor.
+        self.queue = asyncio.Queue(self.queue_size)
+        self.consumers = [asyncio.create_task(self.consume()) for _ in range(self.workers)]
+        return self
+
+    async def __aexit__(self, *exc):
+        for consumer in self.consumers:
+            consumer.cancel()
+        await asyncio.gather(*self.consumers, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            request, future = await self.queue.get()
+            try:
+                future.set_result(await loop.run_in_executor(self.executor, answer, request))
+            except Exception as error:
+                future.set_result({"error": str(error)})
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, request) -> asyncio.Future:
+        """Queues a solve or enumerate request (waiting while the queue is full), and returns a future of its
+        response."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return future
+
+    async def serve(self, lines, respond):
+        """Answers every request in an async iterable of lines (str or bytes), awaiting respond() (a coroutine
+        function) with each response once it's answered, one at a time. Returns when every response has been
+        sent."""
+        pending = set()
+        responses = asyncio.Queue()
+
+        def done(start, request_id, future):
+            pending.discard(future)
+            response = {"id": request_id} if request_id is not None else {}
+            response.update(future.result())
+            response["seconds"] = round(time.perf_counter() - start, 6)
+            responses.put_nowait(response)
+
+        async def send():
+            while True:
+                response = await responses.get()
+                try:
+                    await respond(response)
+                except ConnectionError:
+                    pass    #   The other end is gone, so there's no one to answer.
+                finally:
+                    responses.task_done()
+
+        sender = asyncio.create_task(send())
+        try:
+            async for text in lines:
+                if not text.strip():
+                    continue
+                #   A client that doesn't read its responses isn't read from either, until they're sent:
+                if responses.qsize() >= self.queue_size:
+                    await responses.join()
+                start = time.perf_counter()
+                future = asyncio.get_running_loop().create_future()
+                request_id = None
+                try:
+                    request = json.loads(text)
+                    request_id = request.get("id")
+                    if request.get("op") not in OPERATIONS:
+                        raise Exception(f"Unknown op {request.get('op')!r}. Use one of: {', '.join(OPERATIONS)}")
+                    if request["op"] == "verify":
+                        valid, solved = validate(request["board"], request["line"])
+                        future.set_result({"valid": valid, "solved": solved})
+                    else:
+                        future = await self.submit(request)
+                except Exception as error:
+                    future.set_result({"error": str(error)})
+                pending.add(future)
+                future.add_done_callback(lambda future, start=start, request_id=request_id:
+                                         done(start, request_id, future))
+            if pending:
+                await asyncio.wait(pending)
+            await responses.join()
+        finally:
+            sender.cancel()
+
+
+def json_line(response) -> str:
+    return json.dumps(response, separators=(",", ":")) + "\n"
+
+
+async def serve_stdio(service):
+    async def lines():
+        #   Standard input is read in a thread, since it can be a file that asyncio can't wait on.
+        loop = asyncio.get_running_loop()
+        while text := await loop.run_in_executor(None, sys.stdin.readline):
+            yield text
+
+    async def respond(response):
+        sys.stdout.write(json_line(response))
+        sys.stdout.flush()
+
+    await service.serve(lines(), respond)
+
+
+async def serve_socket(service, path):
+    async def connection(reader, writer):
+        async def respond(response):
+            if not writer.is_closing():
+                writer.write(json_line(response).encode())
+                await writer.drain()
+
+        try:
+            await service.serve(reader, respond)
+        finally:
+            writer.close()
+
+    server = await asyncio.start_unix_server(connection, path, limit=LINE_LIMIT)
+    async with server:
+        await server.serve_forever()
+
+
+async def main(args):
+    async with Service(args.workers, args.connectivity, args.cache, args.warm, args.queue) as service:
+        if args.socket:
+            await serve_socket(service, args.socket)
+        else:
+            await serve_stdio(service)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer verify, solve and enumerate requests with warm solvers.")
+    parser.add_argument("--socket", help="Unix socket to listen on (default: standard input and output)")
+    parser.add_argument("--warm", type=parse_size, nargs="*", default=[], help="board sizes to build up front, e.g. 5x5")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--connectivity", default="binary", choices=BlackAndWhiteSquares.CONNECTIVITY_ENCODINGS)
+    parser.add_argument("--cache", metavar="DIRECTORY", help="load and store theories in a TheoryCache directory")
+    parser.add_argument("--queue", type=int, default=256, help="requests that can wait for a worker (default: 256)")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,109 @@
+"""Streaming solutions out of a theory one at a time, decoded into the same board and line formats used everywhere
+else, and writing them to JSON Lines or a packed binary file without holding them in memory:
+
+    T = example_theory(3, 3, only_solved=True, encoder="cnf")
+    with open("solutions.jsonl", "w") as fp:
+        write_jsonl(decoded_solutions(T, 3, 3), fp)
+"""
+import json
+from collections import namedtuple
+
+from boards import FILE_HEADER, TILE_CODES, TILES
+from run import enumerate_solutions, solution_line
+
+#   board: the tiles with the starting and ending points, in the same format as a static board.
+#   line: the points of the line in order from the starting point to the ending point, same format as a static line.
+#   solved: the line separates every white square from every black square (q).
+Decoded = namedtuple("Decoded", ["board", "line", "solved"])
+
+#   Packed files start with the FILE_HEADER of boards.py, followed by one fixed-size record per solution.
+PACKED_MAGIC = b"BWS1"
+
+
+def decode_solution(solution: dict, cols: int, rows: int) -> Decoded:
+    """Decodes a solution (see enumerate_solutions()) into its board, line and whether it's solved."""
+    line = solution_line(solution)
+    tiles = [["W" if solution[("w", x, y)] else "B" if solution[("b", x, y)] else "" for x in range(cols)]
+             for y in reversed(range(rows))]
+    return Decoded([[line[0], line[-1]]] + tiles, line, solution[("q",)])
+
+
+def decoded_solutions(model, cols: int, rows: int, lazy=False, assumptions=()):
+    """Yields every solution of a model decoded with decode_solution(), one at a time. See enumerate_solutions()."""
+    for solution in enumerate_solutions(model, lazy, assumptions):
+        yield decode_solution(solution, cols, rows)
+
+
+def write_jsonl(solutions, fp) -> int:
+    """Writes decoded solutions as JSON Lines, one object per solution with "board", "line" and "solved". Returns the
+    number of solutions written."""
+    count = 0
+    for solution in solutions:
+        fp.write(json.dumps(solution._asdict(), separators=(",", ":")) + "\n")
+        count += 1
+    return count
+
+
+def packed_layout(cols: int, rows: int):
+    """Returns the number of bits used for a point, and the number of bytes of a record: the solved flag, the
+    starting and ending points, 2 bits per tile (TILE_CODES), and a bit for every connection c(x,y,z)."""
+    point_bits = max(1, ((cols + 1) * (rows + 1) - 1).bit_length())
+    record_bits = 1 + 2 * point_bits + 2 * cols * rows + (cols + 1) * (rows + 1) * 2
+    return point_bits, (record_bits + 7) // 8
+
+
+def write_packed(solutions, fp, cols: int, rows: int) -> int:
+    """Writes decoded solutions to a binary file in the packed format read by read_packed(). Returns the number of
+    solutions written."""
+    point_bits, record_bytes = packed_layout(cols, rows)
+    fp.write(FILE_HEADER.pack(PACKED_MAGIC, cols, rows))
+    count = 0
+    for board, line, solved in solutions:
+        (s_x, s_y), (e_x, e_y) = line[0], line[-1]
+        fields = [(int(solved), 1), (s_x * (rows + 1) + s_y, point_bits), (e_x * (rows + 1) + e_y, point_bits)]
+        fields += [(TILE_CODES[board[rows - y][x]], 2) for x in range(cols) for y in range(rows)]
+        connections = set(zip(line, line[1:])) | set(zip(line[1:], line))
+        fields += [(((x, y), (x, y + 1) if z == 0 else (x + 1, y)) in connections, 1)
+                   for x in range(cols + 1) for y in range(rows + 1) for z in range(2)]
+        record = 0
+        offset = 0
+        for value, bits in fields:
+            record |= int(value) << offset
+            offset += bits
+        fp.write(record.to_bytes(record_bytes, "little"))
+        count += 1
+    return count
+
+
+def read_packed(fp):
+    """Yields the decoded solutions in a file written by write_packed(), one at a time."""
+    magic, cols, rows = FILE_HEADER.unpack(fp.read(FILE_HEADER.size))
+    if magic != PACKED_MAGIC:
+        raise Exception("Not a packed solutions file.")
+    point_bits, record_bytes = packed_layout(cols, rows)
+    while True:
+        data = fp.read(record_bytes)
+        if len(data) < record_bytes:
+            return
+        record = int.from_bytes(data, "little")
+
+        def take(bits):
+            nonlocal record
+            value = record & ((1 << bits) - 1)
+            record >>= bits
+            return value
+
+        solved = bool(take(1))
+        start = divmod(take(point_bits), rows + 1)
+        end = divmod(take(point_bits), rows + 1)
+        tiles = [[None] * cols for y in range(rows)]
+        for x in range(cols):
+            for y in range(rows):
+                tiles[rows - 1 - y][x] = TILES[take(2)]
+        solution = {("s", *start): True}
+        for x in range(cols + 1):
+            for y in range(rows + 1):
+                for z in range(2):
+                    if take(1):
+                        solution[("c", x, y, z)] = True
+        yield Decoded([[start, end]] + tiles, solution_line(solution), solved)
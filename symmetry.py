@@ -0,0 +1,141 @@
+"""Symmetry breaking for the free-board modes (no static board or line).
+
+Rotating or reflecting a configuration, or drawing its line the other way around (swapping the starting and ending
+points), gives another configuration that is valid (and solved) exactly when the original is. That's 16 equivalent
+configurations for square boards (8 rotations and reflections, with and without the swap), and 8 for other boards
+(4 reflections, with and without the swap).
+
+lex_leader() only keeps the configuration of each group of equivalent ones (orbit) that is smallest when its
+propositions are read as a binary number, so the solver searches and counts each orbit once. orbit_size() and
+count_unreduced() map the reduced solutions and counts back to the totals without symmetry breaking.
+"""
+from itertools import combinations
+
+from cnf import PROJECTED_PROPOSITIONS
+from ddnnf import DDNNF
+
+
+def point_maps(cols, rows) -> list:
+    """Rotations and reflections of the point grid, as functions of a point's coordinates (identity first)."""
+    maps = [
+        lambda x, y: (x, y),
+        lambda x, y: (cols - x, y),
+        lambda x, y: (x, rows - y),
+        lambda x, y: (cols - x, rows - y)
+    ]
+    if cols == rows:
+        maps += [
+            lambda x, y: (y, x),
+            lambda x, y: (rows - y, x),
+            lambda x, y: (y, cols - x),
+            lambda x, y: (rows - y, cols - x)
+        ]
+    return maps
+
+
+def permutations(index, cols, rows) -> list:
+    """Every symmetry as a permutation of the configuration's variables: a dictionary of each variable ID in
+    PROJECTED_PROPOSITIONS to the ID it is moved to. The identity comes first."""
+    permutations = []
+    for point_map in point_maps(cols, rows):
+        for swap in (False, True):
+            permutation = {}
+            for kind in PROJECTED_PROPOSITIONS:
+                for var in index.ids(kind):
+                    _, x, y, *z = index.lookup(var)
+                    if kind in ("s", "e", "l"):
+                        image = ({"s": "e", "e": "s"}.get(kind, kind) if swap else kind, *point_map(x, y))
+                    elif kind in ("w", "b"):
+                        (a_x, a_y), (b_x, b_y) = point_map(x, y), point_map(x + 1, y + 1)
+                        image = (kind, min(a_x, b_x), min(a_y, b_y))
+                    elif (z[0] == 0 and y + 1 > rows) or (z[0] == 1 and x + 1 > cols):
+                        image = (kind, x, y, z[0])  #   Connections off the board are always false.
+                    else:
+                        (a_x, a_y), (b_x, b_y) = point_map(x, y), point_map(*((x, y + 1) if z[0] == 0 else (x + 1, y)))
+                        image = (kind, min(a_x, b_x), min(a_y, b_y), 0 if a_x == b_x else 1)
+                    permutation[var] = index.id(*image)
+            permutations.append(permutation)
+    return permutations
+
+
+def lex_leader(cnf, cols, rows):
+    """Adds constraints to a CNF theory of a free board that only allow the smallest configuration of each orbit:
+    for every symmetry, the configuration must be at most its own image under that symmetry."""
+    #   Configurations are compared by their propositions that make up a puzzle, in order:
+    order = [var for kind in PROJECTED_PROPOSITIONS for var in cnf.index.ids(kind)]
+    for permutation in permutations(cnf.index, cols, rows)[1:]:
+        cnf.lex_less_equal(order, [permutation[var] for var in order])
+
+
+def orbit_size(solution, index, cols, rows) -> int:
+    """Returns how many configurations are equivalent to the configuration of a solution (including itself)."""
+    true = frozenset(var for kind in PROJECTED_PROPOSITIONS for var in index.ids(kind) if solution[index.lookup(var)])
+    return len({frozenset(permutation[var] for var in true) for permutation in permutations(index, cols, rows)})
+
+
+def count_dsharp(cnf) -> int:
+    """Counts the solutions of a CNF theory with dsharp (see ddnnf.DSHARP). Its implicit BCP miscounts theories with
+    lex_leader() constraints (e.g. 33151 instead of 5806 for solved 3x2 boards), so it's turned off. Without it,
+    dsharp counts one solution for some unsatisfiable theories, so those are checked first (see DDNNF.compile())."""
+    return DDNNF.compile(cnf).count()
+
+
+def count_unreduced(cnf, cols, rows, counter=None) -> int:
+    """Maps the count of a theory built with symmetry breaking back to the count without it.
+
+    Each orbit is counted once, and holds |G| / |H| configurations, where |G| is the number of symmetries and H
+    are the symmetries that leave the orbit's representative unchanged (a subgroup). So for every subgroup H, the
+    representatives left unchanged by all of H are counted, and the representatives whose symmetries are exactly H
+    are found from those counts by subtracting every larger subgroup's, largest first. The counter defaults to
+    count_dsharp().
+
+    Raises an Exception if the counts can't be right: no subgroup can leave more representatives unchanged than
+    there are, and there can't be more than |G| configurations per representative."""
+    counter = counter or count_dsharp
+    group = [tuple(sorted(permutation.items())) for permutation in permutations(cnf.index, cols, rows)]
+
+    def compose(first, second):
+        second = dict(second)
+        return tuple((var, second[image]) for var, image in first)
+
+    #   Every subgroup is generated by at most 3 symmetries (the group is at most D4 × C2):
+    subgroups = set()
+    for size in range(4):
+        for generators in combinations(group[1:], size):
+            subgroup = {group[0], *generators}
+            while True:
+                products = {compose(a, b) for a in subgroup for b in subgroup} | subgroup
+                if len(products) == len(subgroup):
+                    break
+                subgroup = products
+            subgroups.add(frozenset(subgroup))
+    subgroups = sorted(subgroups, key=len)
+
+    #   Representatives left unchanged by every symmetry of each subgroup:
+    fixed = {}
+    for subgroup in subgroups:
+        if any(fixed[smaller] == 0 for smaller in fixed if smaller < subgroup):
+            fixed[subgroup] = 0
+            continue
+        theory = cnf.copy()
+        for permutation in subgroup:
+            for var, image in permutation:
+                if var != image:
+                    theory.add_clause(-var, image)
+        fixed[subgroup] = counter(theory)
+
+    #   The identity's subgroup (the smallest) leaves every representative unchanged:
+    representatives = fixed[subgroups[0]]
+    if any(count > representatives for count in fixed.values()):
+        raise Exception(f"Miscounted: a subgroup leaves more than all {representatives} representatives unchanged "
+                        f"({max(fixed.values())}).")
+
+    #   Representatives whose symmetries are exactly each subgroup:
+    exact = {}
+    for subgroup in reversed(subgroups):
+        exact[subgroup] = fixed[subgroup] - sum(exact[larger] for larger in exact if subgroup < larger)
+    total = sum(exact[subgroup] * len(group) // len(subgroup) for subgroup in subgroups)
+    if total > len(group) * representatives:
+        raise Exception(f"Miscounted: {total} configurations from {representatives} representatives of up to "
+                        f"{len(group)} each.")
+    return total
@@ -1,6 +1,25 @@
-import os, sys
+import asyncio, copy, io, json, os, random, shutil, sys
 
-from run import example_theory
+import pytest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TheoryCache
+from cnf import CNF
+from checker import BoardChecker
+from run import example_theory, enumerate_solutions, find_loops, solve, solution_line, static_literals, \
+    BlackAndWhiteSquares
+from validator import validate
+from batch import connection_arrays, evaluate, tile_codes
+from symmetry import count_unreduced, orbit_size
+from stream import decoded_solutions, read_packed, write_jsonl, write_packed
+from puzzles import solve_all
+from generator import generate
+from ddnnf import DDNNF, DSHARP
+from portfolio import Configuration, race
+from service import Service
+from benchmark import compare, measure
+from boards import load_boards, pack_array, pack_board, read_boards, unpack_board, write_boards
 
 USAGE = '\n\tpython3 test.py [draft|final]\n'
 EXPECTED_VAR_MIN = 10
@@ -15,6 +34,403 @@ def test_theory():
     assert not T.valid(), "Theory is valid (every assignment is a solution). Something is likely wrong with the constraints."
     assert not T.negate().valid(), "Theory is inconsistent (no solutions exist). Something is likely wrong with the constraints."
 
+BOARD = [
+    [(3,3), (0,0)],
+    ["B", "W", "W"],
+    ["B", "", "W"],
+    ["B", "W", "W"]
+]
+LINE = [(3, 3), (3, 2), (2, 2), (2, 1), (2, 0), (1, 0), (1, 1), (0, 1), (0, 2), (1, 2), (1, 3)]
+
+def test_enumerate_solutions():
+    T = example_theory(3, 3, board=copy.deepcopy(BOARD), only_solved=True).compile()
+    solutions = list(enumerate_solutions(T))
+
+    #   Every solution is returned exactly once:
+    lines = {frozenset(key for key, value in solution.items() if value and key[0] in "lc") for solution in solutions}
+    assert len(solutions) == len(lines) == 14
+    assert all(solution[("q",)] for solution in solutions)
+
+def test_binary_distance():
+    #   Both connectivity encodings must allow exactly the same solutions.
+    T = example_theory(3, 3, board=copy.deepcopy(BOARD), only_solved=True, connectivity="binary").compile()
+    assert len(list(enumerate_solutions(T))) == 14
+    T = example_theory(3, 3, line=LINE, only_solved=True, connectivity="binary").compile()
+    assert len(list(enumerate_solutions(T))) == 124
+
+def test_lazy_connectivity():
+    #   Cutting off loops while solving must allow exactly the same solutions as the distance encoding.
+    T = example_theory(3, 3, board=copy.deepcopy(BOARD), only_solved=True, connectivity="lazy").compile()
+    solutions = list(enumerate_solutions(T, lazy=True))
+    assert len(solutions) == 14
+    assert not any(find_loops(solution) for solution in solutions)
+
+    T = example_theory(4, 4, only_solved=True, connectivity="lazy").compile()
+    assert all(not find_loops(solution) for solution, _ in zip(enumerate_solutions(T, lazy=True), range(50)))
+
+def test_cnf_encoder():
+    #   Building the theory straight into CNF must allow exactly the same solutions as bauhaus.
+    for connectivity in ("distance", "binary", "lazy"):
+        lazy = connectivity == "lazy"
+        T = example_theory(3, 3, board=BOARD, only_solved=True, connectivity=connectivity, encoder="cnf")
+        assert len(list(enumerate_solutions(T, lazy))) == 14
+        T = example_theory(3, 3, line=LINE, only_solved=True, connectivity=connectivity, encoder="cnf")
+        assert len(list(enumerate_solutions(T, lazy))) == 124
+
+def test_constraint_families():
+    families = {"start/end", "colours", "touching", "solved", "connections", "degree", "distance", "static"}
+    for encoder in ("nnf", "cnf"):
+        theory = BlackAndWhiteSquares(3, 3, None, None, True, "binary", encoder)
+        T = theory.cnf if encoder == "cnf" else CNF.from_nnf(theory.E.compile())
+        sizes = theory.family_sizes()
+        assert families <= set(sizes)
+        assert all(size.clauses > 0 and size.literals >= size.clauses for size in sizes.values())
+
+        #   Solver statistics through the profiling hook:
+        assert solve(T, profile=theory.profile) is not None
+        assert {"conflicts", "decisions", "propagations"} <= set(theory.solver_stats)
+        assert theory.solver_stats["propagations"] > 0
+
+    #   Every clause belongs to one family (with nothing left for simplify() to remove):
+    theory = BlackAndWhiteSquares(3, 3, None, None, False, "binary", "cnf", structural=True)
+    assert sum(size.clauses for size in theory.family_sizes().values()) == len(theory.cnf.clauses)
+
+def test_var_index():
+    #   Every ID maps back to its own key, including coordinates of 10 and more.
+    bws = BlackAndWhiteSquares(11, 10, None, None, True, "lazy", "cnf")
+    index = bws.index
+    assert all(index.id(*index.lookup(var)) == var for var in range(1, index.num_vars + 1))
+    assert index.lookup(bws.c[11][10][1]) == ("c", 11, 10, 1)
+    with pytest.raises(IndexError):
+        index.id("s", 0, 11)
+    with pytest.raises(IndexError):
+        index.id("s", -1, 0)
+    for key in (("c", 0, 1), ("s", 1, 2, 5), ("q", 4)):
+        with pytest.raises(IndexError):
+            index.id(*key)
+
+    solution = solve(bws.cnf, lazy=True)
+    assert len(solution) == index.num_vars
+    assert sum(solution[("s", x, y)] for x in range(12) for y in range(11)) == 1
+
+def test_independent_theories():
+    #   Building a theory must not add anything to any other theory.
+    sizes = [len(example_theory()._custom_constraints) for _ in range(3)]
+    assert sizes[0] == sizes[1] == sizes[2]
+
+    #   Theories can be built in parallel threads.
+    def count_board_solutions(connectivity):
+        T = example_theory(3, 3, board=BOARD, only_solved=True, connectivity=connectivity).compile()
+        return len(list(enumerate_solutions(T, connectivity == "lazy")))
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(count_board_solutions, ["distance", "binary", "lazy"] * 2)) == [14] * 6
+
+def test_theory_cache(tmp_path):
+    cache = TheoryCache(tmp_path)
+    T = cache.load(3, 3, "binary")
+    assert cache.load(3, 3, "binary").clauses == T.clauses
+    assert len(list(tmp_path.iterdir())) == 1
+
+    #   Static boards and lines are applied as assumptions on top of the cached theory:
+    T = cache.load(3, 3, "binary")
+    assert len(list(enumerate_solutions(T, assumptions=static_literals(T.index, board=BOARD, only_solved=True)))) == 14
+    assert len(list(enumerate_solutions(T, assumptions=static_literals(T.index, line=LINE, only_solved=True)))) == 124
+
+    #   Least recently used theories are deleted once the cache is full:
+    cache.max_bytes = os.path.getsize(cache.path(3, 3, "binary")) + 1
+    cache.load(2, 2, "binary")
+    assert [path.name for path in tmp_path.iterdir()] == [os.path.basename(cache.path(2, 2, "binary"))]
+
+@pytest.mark.skipif(shutil.which(DSHARP) is None, reason="dsharp isn't installed or in bin/")
+def test_compiled_theory(tmp_path):
+    cache = TheoryCache(tmp_path)
+    compiled = cache.load_compiled(2, 2, "binary")
+    solved = static_literals(compiled.index, only_solved=True)
+    assert compiled.count(static_literals(compiled.index)) == 24472
+    assert compiled.count(solved) == 3592
+
+    #   Enumeration and sampling under assumptions only return solutions that satisfy them:
+    start = [compiled.index.id("s", 0, 0)]
+    solutions = list(compiled.enumerate(solved + start))
+    assert len(solutions) == compiled.count(solved + start)
+    assert len({tuple(sorted(solution.items())) for solution in solutions}) == len(solutions)
+    assert all(solution[("q",)] and solution[("s", 0, 0)] for solution in solutions)
+    assert compiled.sample(solved + start, random.Random(0)) in solutions
+
+    #   The compiled theory is cached, and reads back the same:
+    assert os.path.exists(cache.path(2, 2, "binary", ".nnf"))
+    buffer = io.StringIO()
+    compiled.save(buffer)
+    buffer.seek(0)
+    assert DDNNF.load(buffer).count(solved) == 3592
+    assert cache.load_compiled(2, 2, "binary").count(solved) == 3592
+
+def test_board_checker():
+    with BoardChecker(3, 3) as checker:
+        solutions = list(checker.solutions(board=BOARD))
+        assert len(solutions) == 14
+        #   Blocking clauses of an enumeration don't carry over to later calls:
+        assert len(list(checker.solutions(board=BOARD))) == 14
+        assert len(list(checker.solutions(line=LINE))) == 124
+
+        #   Checks in the middle of an enumeration don't change which solutions it blocks:
+        interleaved = []
+        for solution in checker.solutions(line=LINE):
+            checker.check(board=BOARD)
+            interleaved.append(solution)
+            assert len(interleaved) <= 124
+        assert len({tuple(sorted(solution.items())) for solution in interleaved}) == 124
+
+        assert all(checker.check(board=BOARD, line=solution_line(solution)).solved for solution in solutions)
+        assert checker.check(board=BOARD).solved
+        assert not checker.check(board=BOARD, line=LINE).valid
+
+        #   Points off the board aren't valid, rather than another point's variable:
+        off_board = [[(0, 4), (3, 0)]] + BOARD[1:]
+        assert checker.check(board=off_board) == (False, False, None)
+        assert checker.check(board=off_board, line=[(0, 4), (0, 3)]) == (False, False, None)
+        assert validate(off_board, [(0, 4), (0, 3)]) == (False, False)
+
+def random_case(cols, rows, rng):
+    """A random board with at most one empty tile, and a random self-avoiding walk on its points that usually
+    starts and ends at the board's starting and ending points. Sometimes the starting point is off the board."""
+    line = [(rng.randint(0, cols), rng.randint(0, rows))]
+    for _ in range(rng.randint(1, (cols + 1) * (rows + 1))):
+        x, y = line[-1]
+        steps = [(x + d_x, y + d_y) for d_x, d_y in ((0, 1), (1, 0), (0, -1), (-1, 0))
+                 if 0 <= x + d_x <= cols and 0 <= y + d_y <= rows and (x + d_x, y + d_y) not in line]
+        if not steps:
+            break
+        line.append(rng.choice(steps))
+    tiles = [[rng.choice("WB") for x in range(cols)] for y in range(rows)]
+    if rng.random() < 0.5:
+        tiles[rng.randrange(rows)][rng.randrange(cols)] = ""
+    if rng.random() < 0.1:
+        #   A starting point off the board or past its last point, sometimes with the line running to it:
+        x, y = line[0]
+        off_board = rng.choice([(-1, y), (cols + 1, y), (x, -1), (x, rows + 1), (x, rows + 2)])
+        if rng.random() < 0.5 and abs(off_board[0] - x) + abs(off_board[1] - y) == 1:
+            line.insert(0, off_board)
+        ends = [off_board, line[-1]]
+    else:
+        ends = [line[0], line[-1]] if rng.random() < 0.9 else [line[-1], line[0]]
+    return [ends] + tiles, line
+
+def test_validator():
+    assert validate(BOARD, LINE) == (False, False)
+    with BoardChecker(3, 3) as checker:
+        for solution in checker.solutions(board=BOARD):
+            assert validate(BOARD, solution_line(solution)) == (True, True)
+
+    #   Differential test against the theory on random small boards:
+    rng = random.Random(204)
+    for cols, rows in ((2, 2), (3, 2), (2, 3), (3, 3)):
+        with BoardChecker(cols, rows) as checker:
+            for _ in range(200):
+                board, line = random_case(cols, rows, rng)
+                if rng.random() < 0.5:
+                    #   Colour the board like any board the line solves, and sometimes flip one of its tiles:
+                    solution = checker.check(line=line).solution
+                    if solution is not None:
+                        board[1:] = [["W" if solution[("w", x, y)] else "B" if solution[("b", x, y)] else ""
+                                      for x in range(cols)] for y in reversed(range(rows))]
+                        if rng.random() < 0.5:
+                            row, col = rng.randrange(rows) + 1, rng.randrange(cols)
+                            board[row][col] = {"W": "B", "B": "W", "": "W"}[board[row][col]]
+                check = checker.check(board=board, line=line)
+                assert validate(board, line) == (check.valid, check.solved), (board, line)
+
+def test_empty_regions():
+    #   Boards where squares of both colours share a region only through several empty tiles:
+    boards = [[[(3, 3), (0, 0)], ["B", "", ""], ["W", "", "W"], ["B", "W", "W"]],
+              [[(0, 3), (4, 0)], ["W", "", "", ""], ["", "", "W", ""], ["", "", "", "B"]]]
+    for board in boards:
+        cols, rows = len(board[1]), len(board) - 1
+        for encoder in BlackAndWhiteSquares.ENCODERS:
+            E = example_theory(cols, rows, board=board, connectivity="binary", encoder=encoder)
+            solutions = list(decoded_solutions(E.compile(), cols, rows))
+            assert solutions and any(decoded.solved for decoded in solutions)
+            assert all(validate(board, decoded.line) == (True, decoded.solved) for decoded in solutions)
+        with BoardChecker(cols, rows) as checker:
+            for decoded in solutions[:20]:
+                assert checker.check(board, decoded.line)[:2] == (True, decoded.solved)
+            assert len(list(checker.solutions(board, only_solved=False))) == len(solutions)
+
+def test_packed_boards():
+    board = pack_board(BOARD)
+    assert unpack_board(board) == json.loads(json.dumps(BOARD))
+    index = example_theory(3, 3, encoder="cnf").index
+    assert static_literals(index, board) == static_literals(index, BOARD)
+    assert board == pack_array(tile_codes([BOARD])[0], (3, 3), (0, 0))
+
+    fp = io.BytesIO()
+    assert write_boards([board] * 3, fp, 3, 3) == 3
+    fp.seek(0)
+    assert list(read_boards(fp)) == [board] * 3
+    fp.seek(0)
+    starts, ends, tiles = load_boards(fp)
+    assert starts.tolist() == [[3, 3]] * 3 and ends.tolist() == [[0, 0]] * 3
+    assert (tiles == tile_codes([BOARD] * 3)).all()
+
+    with BoardChecker(3, 3) as checker:
+        assert len(list(checker.solutions(board=board))) == 14
+
+def test_batch():
+    rng = random.Random(204)
+    cases = [random_case(3, 3, rng) for _ in range(500)]
+    with BoardChecker(3, 3) as checker:
+        cases += [(BOARD, solution_line(solution)) for solution in checker.solutions(board=BOARD)]
+    cases = [(board, line) for board, line in cases if validate(board, line).valid]
+
+    labels, solved = evaluate(tile_codes([board for board, _ in cases]),
+                              connection_arrays([line for _, line in cases], 3, 3))
+    assert labels.shape == (len(cases), 3, 3)
+    assert list(solved) == [validate(board, line).solved for board, line in cases]
+    assert solved[-14:].all()
+
+def test_symmetry_breaking():
+    #   3592 solved 2x2 boards without symmetry breaking:
+    T = example_theory(2, 2, only_solved=True, encoder="cnf", symmetry_breaking=True)
+    solutions = list(enumerate_solutions(T))
+    assert len(solutions) == 232
+    assert sum(orbit_size(solution, T.index, 2, 2) for solution in solutions) == 3592
+    assert count_unreduced(T, 2, 2, counter=lambda theory: len(list(enumerate_solutions(theory)))) == 3592
+
+    #   A miscount (the identity counts every representative, so no subgroup can count more) is caught:
+    counts = iter([232] + [10 ** 99] * 100)
+    with pytest.raises(Exception, match="Miscounted"):
+        count_unreduced(T, 2, 2, counter=lambda theory: next(counts))
+
+    #   Non-square boards only have half of the symmetries (76 solved 2x1 boards without symmetry breaking):
+    T = example_theory(2, 1, only_solved=True, encoder="cnf", symmetry_breaking=True)
+    solutions = list(enumerate_solutions(T))
+    assert len(solutions) == 11
+    assert sum(orbit_size(solution, T.index, 2, 1) for solution in solutions) == 76
+
+def test_benchmark(monkeypatch):
+    phases = {"build": {"seconds": 1.0, "peak_mb": 100.0}, "solve": {"seconds": 0.01, "peak_mb": 100.0}}
+    old = {"mode": 1, "cols": 3, "rows": 3, "connectivity": "binary", "encoder": "cnf", "phases": phases,
+           "vars": 524, "clauses": 2025, "families": {"touching": {"variables": 10, "clauses": 20, "literals": 50}}}
+    new = copy.deepcopy(old)
+    assert compare([new], [old], 0.25) == []
+
+    new["clauses"] = 2030
+    new["families"]["touching"]["clauses"] = 25
+    new["phases"]["build"]["seconds"] = 1.5
+    new["phases"]["solve"]["seconds"] = 0.03    #   Too fast to compare.
+    new["phases"]["solve"]["peak_mb"] = 200.0
+    assert [description for _, description in compare([new], [old], 0.25)] == [
+        "clauses 2025 -> 2030", "touching clauses 20 -> 25", "build 1.000s -> 1.500s (1.50x)",
+        "solve peak 100.0MB -> 200.0MB (2.00x)"]
+
+    #   A failed count keeps the phases measured before it:
+    def fail(model):
+        raise FileNotFoundError("dsharp")
+    monkeypatch.setattr("run.count", fail)
+    record = measure(2, 2, 2, "binary", "cnf")
+    assert "error" in record and record["satisfiable"] and record["vars"] > 0
+    assert set(record["phases"]) == {"build", "compile", "satisfiable", "solve"}
+
+def test_static_line():
+    #   A static line fixes every distance, so only unit clauses are left of the distance constraints:
+    line = [(x, y if x % 2 == 0 else 7 - y) for x in range(8) for y in range(8)]
+    T = example_theory(7, 7, line=line, only_solved=True, encoder="cnf")
+    distances = set(T.index.ids("d"))
+    assert all(len(clause) == 1 for clause in T.clauses if any(abs(lit) in distances for lit in clause))
+    assert solve(T) is not None
+
+    assert len(list(enumerate_solutions(example_theory(line=LINE, only_solved=True).compile()))) == 124
+
+def test_streaming():
+    T = example_theory(board=BOARD, only_solved=True, encoder="cnf")
+    solutions = list(decoded_solutions(T, 3, 3))
+    assert len(solutions) == 14
+    assert all(validate(board, line) == (True, solved) for board, line, solved in solutions)
+
+    fp = io.StringIO()
+    assert write_jsonl(iter(solutions), fp) == 14
+    assert [json.loads(line)["solved"] for line in fp.getvalue().splitlines()] == [True] * 14
+
+    fp = io.BytesIO()
+    assert write_packed(iter(solutions), fp, 3, 3) == 14
+    fp.seek(0)
+    assert list(read_packed(fp)) == solutions
+
+def test_puzzles():
+    rng = random.Random(204)
+    cases = [random_case(3, 3, rng) for _ in range(50)]
+    lines = [json.dumps({"board": board, "line": line}) + "\n" for board, line in cases]
+    lines += ["\n", json.dumps({"board": BOARD}) + "\n", json.dumps({"line": LINE, "cols": 3, "rows": 3}) + "\n", "{\n"]
+
+    results = list(solve_all(lines, workers=2, chunksize=8))
+    assert [result["puzzle"] for result in results] == list(range(1, 54))
+    for (board, line), result in zip(cases, results):
+        assert validate(board, line) == (result["valid"], result["solved"])
+    assert results[50]["solved"] and validate(results[50]["board"], results[50]["line"]) == (True, True)
+    assert results[51]["solved"] and results[51]["line"] == LINE
+    assert "error" in results[52]
+
+def test_service():
+    requests = [{"id": 1, "op": "verify", "board": BOARD, "line": LINE},
+                {"id": 2, "op": "solve", "board": BOARD},
+                {"id": 3, "op": "enumerate", "board": BOARD},
+                {"id": 4, "op": "enumerate", "line": LINE, "cols": 3, "rows": 3, "limit": 1000},
+                {"id": 5, "op": "enumerate", "board": BOARD, "limit": 5},
+                {"id": 6, "op": "unknown"}]
+
+    async def serve():
+        async def lines():
+            for request in requests:
+                yield json.dumps(request) + "\n"
+            yield "{\n"
+
+        responses = []
+
+        async def respond(response):
+            await asyncio.sleep(0.01)   #   A client that reads slowly.
+            responses.append(response)
+
+        async with Service(workers=2, warm=[(3, 3)], queue_size=2) as service:
+            await service.serve(lines(), respond)
+        return responses
+
+    responses = asyncio.run(serve())
+    assert len(responses) == 7
+    by_id = {response.get("id"): response for response in responses}
+    assert (by_id[1]["valid"], by_id[1]["solved"]) == validate(BOARD, LINE)
+    assert by_id[2]["solved"] and validate(BOARD, by_id[2]["line"]) == (True, True)
+    assert len(by_id[3]["solutions"]) == 14 and by_id[3]["complete"]
+    assert len(by_id[4]["solutions"]) == 124
+    assert len(by_id[5]["solutions"]) == 5 and not by_id[5]["complete"]
+    assert "error" in by_id[6] and "error" in by_id[None]
+
+def test_generator():
+    puzzles = list(generate(4, 4, 6, workers=2, seed=204, attempts=16))
+    assert len(puzzles) == 6
+    assert puzzles == list(generate(4, 4, 6, workers=1, seed=204, attempts=16))
+    with BoardChecker(4, 4) as checker:
+        for board, line in puzzles:
+            assert validate(board, line) == (True, True)
+            assert len(list(checker.solutions(board=board))) == 1
+
+def test_portfolio():
+    result = race(3, 3, board=BOARD, only_solved=True, workers=3)
+    assert validate(BOARD, solution_line(result.solution)).solved
+
+    #   No solution is an answer too:
+    white = [BOARD[0]] + [["W"] * 3 for _ in range(3)]
+    assert race(3, 3, board=white, only_solved=True, workers=2).solution is None
+
+    #   Configurations that fail never win:
+    configurations = [Configuration("binary", "no-such-solver", False), Configuration("lazy", "cadical153", False)]
+    result = race(3, 3, only_solved=True, configurations=configurations, workers=2)
+    assert result.winner == configurations[1] and result.solution[("q",)]
+
+    #   Kissat doesn't expose its statistics, so the profiling hook is skipped:
+    bws = BlackAndWhiteSquares(3, 3, None, None, True, "binary", "cnf")
+    assert solve(bws.cnf, profile=bws.profile, backend="kissat404")[("q",)]
+    assert bws.solver_stats is None
+
 def file_checks(stage):
     proofs_jp = os.path.isfile(os.path.join('.','documents',stage,'proofs.jp'))
     modelling_report_docx = os.path.isfile(os.path.join('.','documents',stage,'modelling_report.docx'))
@@ -0,0 +1,74 @@
+"""Checking whether a drawn line solves a static board directly, in time linear in the size of the board, without
+building a theory or calling a SAT solver:
+
+    valid, solved = validate(board, line)
+"""
+from collections import namedtuple
+
+from run import line_connections, parse_board
+
+#   valid: the board and line form a configuration the theory allows (a simple path from the board's starting
+#       point to its ending point, on a board with at least one white and one black square).
+#   solved: the line separates every white square from every black square, i.e. the theory's q.
+Verdict = namedtuple("Verdict", ["valid", "solved"])
+
+INVALID = Verdict(False, False)
+
+
+def validate(board, line) -> Verdict:
+    """Checks a static line (same format as the line in run.py) against a static board (same format as the board
+    in run.py).
+
+    The tiles are flood filled into regions that aren't separated by the line, and the line solves the board if no
+    region holds both a white and a black square, including through empty tiles. This is the same verdict as q,
+    also when empty tiles touch (see BlackAndWhiteSquares.build_region_constraints())."""
+    start, end, tiles = parse_board(board)
+    cols, rows = len(tiles), len(tiles[0])
+
+    if not any("W" in column for column in tiles) or not any("B" in column for column in tiles):
+        return INVALID
+
+    #   The line must be a simple path on the point grid from the starting point to the ending point:
+    line = [tuple(point) for point in line]
+    if len(line) < 2 or line[0] != tuple(start) or line[-1] != tuple(end):
+        return INVALID
+    if len(set(line)) != len(line):
+        return INVALID
+    for x, y in line:
+        if not (0 <= x <= cols and 0 <= y <= rows):
+            return INVALID
+    for (x, y), (next_x, next_y) in zip(line, line[1:]):
+        if abs(next_x - x) + abs(next_y - y) != 1:
+            return INVALID
+    connections = set(line_connections(line))
+
+    #   Look for a region with both colours:
+    colours = {}
+    for x, column in enumerate(region_labels(cols, rows, connections)):
+        for y, label in enumerate(column):
+            colours.setdefault(label, set()).add(tiles[x][y])
+    if any("W" in region and "B" in region for region in colours.values()):
+        return Verdict(True, False)
+    return Verdict(True, True)
+
+
+def region_labels(cols, rows, connections) -> list:
+    """Flood fills the tiles into the regions that the connections (a set of (x, y, z) like c(x,y,z)) separate.
+    Returns labels[x][y], the first tile of the region that tile (x, y) is in."""
+    labels = [[None] * rows for _ in range(cols)]
+    for x in range(cols):
+        for y in range(rows):
+            if labels[x][y] is not None:
+                continue
+            labels[x][y] = (x, y)
+            stack = [(x, y)]
+            while stack:
+                t_x, t_y = stack.pop()
+                #   Neighbouring tiles and the connection separating them, in the order {up, right, down, left}:
+                for n_x, n_y, connection in ((t_x, t_y + 1, (t_x, t_y + 1, 1)), (t_x + 1, t_y, (t_x + 1, t_y, 0)),
+                                             (t_x, t_y - 1, (t_x, t_y, 1)), (t_x - 1, t_y, (t_x, t_y, 0))):
+                    if 0 <= n_x < cols and 0 <= n_y < rows and labels[n_x][n_y] is None \
+                            and connection not in connections:
+                        labels[n_x][n_y] = (x, y)
+                        stack.append((n_x, n_y))
+    return labels